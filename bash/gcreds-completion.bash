@@ -285,7 +285,7 @@ function _gcreds_completions(){
     numoptions=0
 
     # option strings
-    commands='--accounts --awscli --configure --clean --help --mfa-code --profile --mfa-code --show --version'
+    commands='--accounts --awscli --configure --clean --concurrency --help --lazy --mfa-code --profile --mfa-code --refresh-window --retry-failed --reuse-valid --serve --show --sts-region --version'
 
     # complementary command sets
     accounts_compcommands='--mfa-code --profile --refresh-hours'
@@ -329,7 +329,7 @@ function _gcreds_completions(){
             ;;
 
         '--c'*)
-            COMPREPLY=( $(compgen -W '--clean --configure' -- ${cur}) )
+            COMPREPLY=( $(compgen -W '--clean --concurrency --configure' -- ${cur}) )
             return 0
             ;;
 
@@ -338,6 +338,11 @@ function _gcreds_completions(){
             return 0
             ;;
 
+        '--l'*)
+            COMPREPLY=( $(compgen -W '--lazy' -- ${cur}) )
+            return 0
+            ;;
+
         '--m'*)
             COMPREPLY=( $(compgen -W '--mfa-code' -- ${cur}) )
             return 0
@@ -348,8 +353,13 @@ function _gcreds_completions(){
             return 0
             ;;
 
+        '--r'*)
+            COMPREPLY=( $(compgen -W '--refresh-hours --refresh-window --retry-failed --reuse-valid' -- ${cur}) )
+            return 0
+            ;;
+
         '--s'*)
-            COMPREPLY=( $(compgen -W '--show' -- ${cur}) )
+            COMPREPLY=( $(compgen -W '--serve --show --sts-region' -- ${cur}) )
             return 0
             ;;
 
@@ -386,7 +396,22 @@ function _gcreds_completions(){
             return 0
             ;;
 
-        '--awscli' | '--configure'  | 'help' | '--clean' | '--mfa-code' | '--show' | '--version')
+        '--sts-region')
+            COMPREPLY=( $(compgen -W "auto global us-east-1 us-east-2 us-west-1 us-west-2 eu-west-1 eu-central-1 ap-southeast-1 ap-northeast-1" -- ${cur}) )
+            return 0
+            ;;
+
+        '--concurrency')
+            COMPREPLY=( $(compgen -W "1 5 10 25 50 100" -- ${cur}) )
+            return 0
+            ;;
+
+        '--refresh-window')
+            COMPREPLY=( $(compgen -W "1 5 10 15 30" -- ${cur}) )
+            return 0
+            ;;
+
+        '--awscli' | '--configure'  | 'help' | '--clean' | '--lazy' | '--mfa-code' | '--retry-failed' | '--reuse-valid' | '--serve' | '--show' | '--version')
             return 0
             ;;
 
@@ -0,0 +1,1204 @@
+#!/usr/bin/env python3
+"""
+Summary:
+    gcreds credential engine.  Generates the STS session token for the iam
+    user and temporary role credentials for every profile in an account list
+    in a single process, writing [gcreds-<profile>] sections to the local
+    awscli credentials file, or with --output-file to a dedicated gcreds
+    credentials file which leaves the user's own file untouched.
+
+Usage:
+    $ python3 credential_engine.py [--sts-region <region|global|auto>] session --profile <iam user> --serial <mfa arn>
+                --code <mfa code> --duration <seconds> --output <file> [--expiration-file <file>]
+                [--update-credentials]
+
+    $ python3 credential_engine.py [--sts-region <region|global|auto>] roles --accounts <file> --profile <iam user>
+                --duration <seconds> [--concurrency <workers>] [--failed-list <file>]
+                [--refresh-window <seconds>] [--expiration-file <file>] [--process-config <file>]
+                [--process-cache <dir>] [--provider <gcreds path>] [--lazy] [--hot-window <seconds>]
+
+    $ python3 credential_engine.py [--output-file <file>] provide <profile> [--principal <iam user>]
+
+    $ python3 credential_engine.py [--output-file <file>] serve [--bind <address>] [--port <port>] [--socket <path>]
+
+    $ python3 credential_engine.py fetch <profile> [<profile> ...] [--socket <path>]
+
+    $ python3 credential_engine.py schedule --refresh-window <seconds> --lifetime <seconds>
+                --session-file <file> --expiration-file <file> [--hot-window <seconds>]
+
+    $ python3 credential_engine.py principals --accounts <file> --profile <iam user>
+
+    $ python3 credential_engine.py install <section file> [<section file> ...]
+
+    Each account list line names a role profile, optionally followed by the
+    iam user (principal) whose session assumes it; --profile is the default
+    principal.  Roles of every principal are minted in one pooled run.
+    'principals' prints the principals other than --profile named in the list.
+    'install' writes the sections of cached section files to the credentials
+    file, replacing sections of the same name (in place where they fit in
+    the gcreds credentials file).
+    'list' prints the section names of the credentials file from the section
+    offset index.  'clean' filters every gcreds section out of the
+    credentials file and, with --process-config, every gcreds stanza out
+    of the awscli config file.
+    With --process-config, a [profile gcreds-<profile>] stanza whose
+    credential_process runs 'gcreds --credential-process <profile>' is added
+    to the awscli config file for each minted profile, and with
+    --process-cache each minted profile gets a process cache entry read by
+    that fast path.  'provide' serves the fast path's cache misses: it
+    answers from the gcreds credentials file or mints the role on demand.
+    'serve' answers container credentials requests and unix socket broker
+    requests for every gcreds profile from memory, refreshing them in the
+    background; 'fetch' gets the credentials of many profiles from the
+    broker at once.
+
+    Role profiles are minted with their own duration_seconds when set.  With
+    --refresh-window only profiles whose credentials are missing from the
+    credentials file or expire within the window (per the credential state
+    index) are minted.  Sections of the dedicated --output-file are
+    rewritten in place; the awscli credentials file, which other tools read
+    and edit, only ever changes by a single atomic replace once the whole
+    set has been minted.  With --lazy nothing is minted up front: every
+    profile of the list is registered (principal and credential_process
+    stanza) and minted by 'provide' or 'serve' the first time a consumer
+    asks for it.  With --lazy or --hot-window, runs follow the usage
+    history the serving paths record (see profile_usage): only profiles
+    requested within the hot window, or usually requested at the coming
+    hour of the day, are minted; the rest lapse until requested.
+    'schedule' drives the gcreds monitor: it sleeps until the next refresh,
+    display or session end deadline and prints one event line for each.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from colors import Colors
+import credential_state
+from credential_server import CredentialBroker, ContainerCredentialsServer, DEFAULT_PORT
+from credential_server import broker_fetch, broker_location, load_token, token_location
+from credential_store import CredentialStore
+from credentials_file import SectionIndex, SectionWriter, iter_blocks, section_index_location
+from profile_index import config_location, credentials_location, index_location, load_index, read_keys, section_keys
+import profile_usage
+from refresh_scheduler import RefreshScheduler
+import sts_endpoints
+from sts_async import AsyncSTSClient
+from sts_client import STSClient, STSError, DEFAULT_REGION
+from throttle import AdaptiveLimiter, MAX_ATTEMPTS, backoff, is_retryable, is_throttle
+
+
+HOME = os.environ['HOME']
+PREFIX = 'gcreds-'
+LOG_FILE = '/var/log/gcreds.log'
+CHAINED_MAX_DURATION = 3600     # seconds, STS limit for role chaining
+STREAM_WINDOW = 64              # minimum profiles scheduled at once from the account list
+DEDUPE_WINDOW = 4096            # recent role requests whose results are shared by later profiles
+PROGRESS_REDRAW = 0.25          # seconds between progress line redraws on a terminal
+PROGRESS_INTERVAL = 10          # seconds between progress lines when not on a terminal
+FAILED_SHOWN = 20               # failed profile names listed in the summary
+PROCESS_WINDOW = 300            # seconds, 'provide' re-mints credentials expiring this soon (gcreds fast path too)
+HOT_WINDOW = 7200               # seconds, profiles requested this recently are kept fresh by usage driven refreshes
+
+# exit codes (match gcreds)
+E_AUTHFAIL = 5
+E_BADPROFILE = 6
+E_BADARG = 8
+
+
+def std_logger(msg, level='INFO'):
+    """Appends msg to the gcreds log in the same format as the bash std_logger"""
+    try:
+        with open(LOG_FILE, 'a') as f1:
+            f1.write('{} {} gcreds: [{}]: {}\n'.format(
+                datetime.datetime.now().strftime('%b %d %H:%M:%S'), socket.gethostname(), level, msg
+            ))
+    except OSError:
+        pass
+
+
+def endpoint_location():
+    """STS endpoint override, honoring the same environment variables as awscli"""
+    return os.environ.get('AWS_ENDPOINT_URL_STS') or os.environ.get('AWS_ENDPOINT_URL')
+
+
+def endpoint_resolver(args, profiles):
+    """
+    Summary:
+        Build the function locating the STS endpoint of a profile.  An
+        explicit --endpoint-url wins, then --sts-region (a region, 'global'
+        or 'auto' for the lowest-latency region), then the profile's own
+        regional endpoint settings.  Endpoints always match the partition
+        of the profile (see sts_endpoints.profile_partition), else that of
+        --sts-region
+    Returns:
+        TYPE: function, profile name => (endpoint url, signing region)
+    """
+    if args.endpoint_url:
+        fixed = (args.endpoint_url, args.region or DEFAULT_REGION)
+        return lambda profile: fixed
+
+    region = args.sts_region
+    if region == sts_endpoints.AUTO:
+        region = sts_endpoints.select_region(args.probe_cache)
+        std_logger('Lowest latency STS endpoint region: {}'.format(region or 'none reachable, using global'))
+
+    def locate(profile):
+        settings = profiles.get(profile, {})
+        partition = sts_endpoints.profile_partition(settings) or \
+            sts_endpoints.partition_of(region if region != sts_endpoints.GLOBAL else None)
+        candidates = [
+            r for r in (region, sts_endpoints.profile_region(settings))
+            if r and (r == sts_endpoints.GLOBAL or sts_endpoints.partition_of(r) == partition)
+        ]
+        return sts_endpoints.endpoint(candidates[0] if candidates else None, partition)
+    return locate
+
+
+def output_location(args):
+    """Credentials file written by gcreds: --output-file, else the awscli credentials file"""
+    return args.output_file or args.credentials_file
+
+
+def in_place(args):
+    """True if sections may be rewritten in place: only in the dedicated gcreds credentials file"""
+    return args.output_file is not None
+
+
+def load_keys(args):
+    """Access keys of the awscli credentials file and, when separate, the gcreds credentials file"""
+    keys = read_keys(args.credentials_file)
+    if output_location(args) != args.credentials_file:
+        keys.update(read_keys(output_location(args)))
+    return keys
+
+
+def sections_index(args):
+    return SectionIndex(output_location(args), args.sections_index)
+
+
+def slot_index(args):
+    """Index of the sections written in padded slots; None for the awscli file, which is never padded"""
+    return sections_index(args) if in_place(args) else None
+
+
+def process_stanza(args, profile):
+    """awscli config section sourcing the credentials of profile via the gcreds credential_process provider"""
+    return '\n[profile {0}{1}]\ncredential_process = {2} --credential-process {1}\n'.format(
+        PREFIX, profile, args.provider
+    )
+
+
+def lazy_location():
+    """Account list of the profiles registered for minting on first use (gcreds --lazy)"""
+    return HOME + '/.gcreds/lazy.accounts'
+
+
+def read_accounts(path, principal=None):
+    """
+    Summary:
+        Stream an account list: one role profile per line, optionally
+        followed by the iam user whose session assumes it
+    Args:
+        :principal (str): iam user of lines naming only a profile
+    Returns:
+        TYPE: generator, (profile, principal) tuples
+    """
+    with open(path) as f1:
+        for line in f1:
+            fields = line.split()
+            if fields and not line.startswith('#'):
+                yield fields[0], fields[1] if len(fields) > 1 else principal
+
+
+def profile_section(name, credentials):
+    """Render temporary credentials as an awscli credentials file section"""
+    return '\n[{}]\naws_access_key_id = {}\naws_secret_access_key = {}\naws_security_token = {}\n'.format(
+        name,
+        credentials['AccessKeyId'],
+        credentials['SecretAccessKey'],
+        credentials['SessionToken']
+    )
+
+
+def source_role(profiles, profile):
+    """Role profile named as source_profile of profile; None when the source is an iam user"""
+    source = profiles.get(profile, {}).get('source_profile')
+    if source and source != profile and profiles.get(source, {}).get('role_arn'):
+        return source
+    return None
+
+
+def role_chain(profiles, profile):
+    """
+    Summary:
+        Follow source_profile links from profile to the first role whose
+        source is an iam user (the root, assumed with session credentials)
+    Returns:
+        TYPE: list, [profile, hub, ..., root]
+    Raises:
+        STSError if source_profile links form a cycle
+    """
+    chain = [profile]
+    hub = source_role(profiles, profile)
+    while hub:
+        if hub in chain:
+            raise STSError('InvalidConfiguration', 'source_profile cycle: ' + ' -> '.join(chain + [hub]))
+        chain.append(hub)
+        hub = source_role(profiles, hub)
+    return chain
+
+
+def chain_duration(chain, profiles, duration):
+    """
+    Summary:
+        Lifetime requested for chain[0]: the profile's duration_seconds when
+        set, else duration.  Role chaining limits credentials of every hop
+        after the root to one hour
+    """
+    try:
+        duration = int(profiles.get(chain[0], {}).get('duration_seconds') or duration)
+    except ValueError:
+        pass
+    return duration if len(chain) == 1 else min(duration, CHAINED_MAX_DURATION)
+
+
+def request_key(chain, profiles, duration, locate):
+    """
+    Summary:
+        Identity of the STS request minting chain[0]: role_arn, duration,
+        external_id and endpoint of every hop.  Profiles with equal keys
+        share one AssumeRole call
+    Returns:
+        TYPE: tuple
+    """
+    return tuple(
+        (
+            profiles[link]['role_arn'],
+            chain_duration(chain[i:], profiles, duration),
+            profiles[link].get('external_id'),
+            locate(link)
+        ) for i, link in enumerate(chain)
+    )
+
+
+async def mint_role(client, limiter, profile, profiles, duration, credentials=None):
+    """
+    Summary:
+        Assume the role of a single profile.  Throttled calls shrink the
+        limiter window; transient failures release their slot and are
+        retried after a jittered exponential backoff
+    Args:
+        :credentials (dict): source credentials when chaining roles,
+            default is the client's (session) credentials
+    Returns:
+        TYPE: tuple, (profile, credentials | STSError)
+    """
+    role_arn = profiles.get(profile, {}).get('role_arn')
+    if not role_arn:
+        return profile, STSError('ProfileNotFound', 'no role_arn in local config')
+    for attempt in range(MAX_ATTEMPTS):
+        token = await limiter.acquire()
+        try:
+            minted = await client.assume_role(
+                role_arn=role_arn,
+                session_name=PREFIX + profile,
+                duration=duration,
+                external_id=profiles[profile].get('external_id'),
+                credentials=credentials
+            )
+        except STSError as e:
+            await limiter.release(token, throttled=is_throttle(e))
+            if is_retryable(e) and attempt + 1 < MAX_ATTEMPTS:
+                await asyncio.sleep(backoff(attempt))
+                continue
+            return profile, e
+        await limiter.release(token)
+        return profile, minted
+
+
+def mint_roles(sessions, accounts, profiles, duration, locate, on_result, concurrency=1):
+    """
+    Summary:
+        Assume the role of each profile in the account list.
+
+        - roles of every principal share one limiter and one connection
+          pool per endpoint; the first hop of each chain is signed with
+          the session credentials of the profile's principal
+        - the account list is consumed as a stream; at most a bounded
+          window of profiles is scheduled or held back at any time, so
+          memory does not grow with the length of the list
+        - results are reported in account list order: a profile done
+          before those listed ahead of it is held back until they are
+        - source_profile chains (user -> hub role -> spoke role) are
+          resolved; each hub is assumed once and its spokes are minted
+          in parallel as soon as it is ready
+        - STS is called once per distinct request (see request_key) and
+          the result fans out to every profile sharing it.  Hub results
+          are kept for the whole run, other results for the most recent
+          DEDUPE_WINDOW requests
+        - requests in flight are bounded by an AIMD limiter capped at
+          concurrency; each STS endpoint has its own connection pool
+
+    Args:
+        :sessions (dict): {principal: session credentials}
+        :accounts (iterable): (profile, principal) tuples
+        :on_result (function): called with ((profile, principal),
+            credentials | STSError) for each profile, in account list order
+    Returns:
+        TYPE: tuple, (limiter, calls); calls is the number of distinct
+        role requests sent to STS
+    """
+    async def run():
+        clients = {}
+        hubs = {}
+        memo = collections.OrderedDict()
+        calls = [0]
+        limiter = AdaptiveLimiter(concurrency)
+
+        def client_for(profile):
+            url, region = locate(profile)
+            if (url, region) not in clients:
+                clients[(url, region)] = AsyncSTSClient(None, url, region, pool_size=concurrency)
+            return clients[(url, region)]
+
+        def mint(chain, principal, hub=False):
+            key = (principal,) + request_key(chain, profiles, duration, locate)
+            if key in hubs:
+                return hubs[key]
+            future = memo.pop(key, None)
+            if future is None:
+                future = asyncio.ensure_future(assume(chain, principal))
+                calls[0] += 1
+            if hub:
+                hubs[key] = future
+                return future
+            memo[key] = future
+            while len(memo) > DEDUPE_WINDOW and next(iter(memo.values())).done():
+                memo.popitem(last=False)
+            return future
+
+        async def assume(chain, principal):
+            profile, source = chain[0], sessions[principal]
+            if len(chain) > 1:
+                _, source = await mint(chain[1:], principal, hub=True)
+                if isinstance(source, STSError):
+                    return profile, STSError(
+                        'SourceProfileFailed', 'source profile {} failed: {}'.format(chain[1], source.code)
+                    )
+            return await mint_role(
+                client_for(profile), limiter, profile, profiles, chain_duration(chain, profiles, duration), source
+            )
+
+        async def resolve(entry):
+            profile, principal = entry
+            if principal not in sessions:
+                return entry, STSError('SessionNotFound', 'no session credentials for ' + PREFIX + principal)
+            if not profiles.get(profile, {}).get('role_arn'):
+                return entry, STSError('ProfileNotFound', 'no role_arn in local config')
+            try:
+                chain = role_chain(profiles, profile)
+            except STSError as e:
+                return entry, e
+            _, outcome = await mint(chain, principal)
+            return entry, outcome
+
+        def collect(done):
+            for task in done:
+                ready[position.pop(task)] = task.result()
+            while head[0] in ready:
+                on_result(*ready.pop(head[0]))
+                head[0] += 1
+
+        window = max(STREAM_WINDOW, 4 * concurrency)
+        pending, position, ready, head = set(), {}, {}, [0]
+        try:
+            for count, entry in enumerate(accounts):
+                # the head of the list is always pending, so the window drains as it completes
+                while len(pending) + len(ready) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    collect(done)
+                task = asyncio.ensure_future(resolve(entry))
+                position[task] = count
+                pending.add(task)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+        finally:
+            for client in clients.values():
+                client.close()
+        return limiter, calls[0]
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def update_failed_list(path, failed):
+    """
+    Summary:
+        Record (profile, principal) entries that failed in this run for
+        'gcreds --retry-failed' in account list format; the list is removed
+        once every profile has succeeded
+    """
+    if failed:
+        with open(path, 'w') as f1:
+            f1.write(''.join('{} {}\n'.format(profile, principal) for profile, principal in failed))
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return '{}m{:02d}s'.format(minutes, seconds) if minutes else '{}s'.format(seconds)
+
+
+class Progress():
+    """
+    Progress of a credential run on one line: profiles completed, rate and
+    estimated time remaining.  Redrawn in place on a terminal; otherwise
+    printed every PROGRESS_INTERVAL seconds
+
+    Args:
+        :total (int): number of profiles in the run
+    """
+    def __init__(self, total, stream=sys.stdout):
+        self.total = total
+        self.done = 0
+        self.failed = []
+        self.stream = stream
+        self.tty = stream.isatty()
+        self.started = time.monotonic()
+        self._shown = 0.0
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0
+        return '    {}Progress{}: {} of {} profiles, {:.1f}/sec, ETA {}'.format(
+            Colors.BOLD, Colors.RESET, self.done, self.total, rate, _duration(eta)
+        )
+
+    def update(self, profile, outcome):
+        self.done += 1
+        if isinstance(outcome, STSError):
+            self.failed.append(profile)
+            self._write('    {}[ {}FAIL{} ]{}  {}: {}'.format(
+                Colors.YELLOW, Colors.RED, Colors.YELLOW, Colors.RESET, PREFIX + profile, outcome
+            ), end='\n')
+            std_logger('Failed to generate temp credentials for role profile [{}]: {}'.format(
+                PREFIX + profile, outcome), 'WARN')
+        now = time.monotonic()
+        if now - self._shown >= (PROGRESS_REDRAW if self.tty else PROGRESS_INTERVAL):
+            self._shown = now
+            self._write(self.line(), end='' if self.tty else '\n')
+
+    def finish(self):
+        self._write(self.line(), end='\n')
+
+    def _write(self, text, end):
+        self.stream.write(('\r\033[K' if self.tty else '') + text + end)
+        self.stream.flush()
+
+
+def report(progress, limiter=None, calls=None):
+    """Print the run summary; returns the number of failures"""
+    failed = progress.failed
+    summary = '{} of {} profiles succeeded, {} failed'.format(
+        progress.done - len(failed), progress.done, len(failed)
+    )
+    if calls is not None and calls != progress.done:
+        summary += ' ({} assume-role calls)'.format(calls)
+    print('\n    {}Summary{}: {}'.format(Colors.BOLD, Colors.RESET, summary))
+    if failed:
+        print('    {}Failed{}:  {}'.format(Colors.BOLD, Colors.RESET, ', '.join(failed[:FAILED_SHOWN]) + (
+            ' ... ({} more)'.format(len(failed) - FAILED_SHOWN) if len(failed) > FAILED_SHOWN else '')
+        ))
+    std_logger('Credential generation summary: ' + summary)
+
+    if limiter is not None:
+        throughput = '{:.1f} calls/sec sustained at concurrency {} ({} throttled)'.format(
+            limiter.rate(), int(limiter.limit), limiter.throttled
+        )
+        print('    {}Throughput{}: {}'.format(Colors.BOLD, Colors.RESET, throughput))
+        std_logger('STS throughput: ' + throughput)
+    return len(failed)
+
+
+# --- commands  -----------------------------------------------------------------------------------
+
+
+def cmd_session(args):
+    """GetSessionToken for the iam user; writes the [gcreds-<user>] section to args.output"""
+    profiles = load_index(args.config_file, args.credentials_file, args.index_file)
+    credentials = read_keys(args.credentials_file).get(args.profile)
+    if credentials is None:
+        std_logger('No access keys found for iam profile [{}]'.format(args.profile), 'ERROR')
+        return E_BADPROFILE
+
+    client = STSClient(credentials, *endpoint_resolver(args, profiles)(args.profile))
+    try:
+        session = client.get_session_token(args.duration, args.serial, args.code)
+    except STSError as e:
+        std_logger('Session token request failed for [{}]: {}'.format(args.profile, e), 'ERROR')
+        return E_AUTHFAIL
+    finally:
+        client.close()
+
+    # session credentials are cached for reuse by later runs; owner access only
+    fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f1:
+        f1.write(profile_section(PREFIX + args.profile, session))
+    if args.expiration_file:
+        credential_state.save_expiration(args.expiration_file, credential_state.parse_expiration(session['Expiration']))
+    if args.update_credentials:
+        writer = SectionWriter(output_location(args), index=slot_index(args), in_place=in_place(args))
+        writer.add(PREFIX + args.profile, profile_section(PREFIX + args.profile, session))
+        writer.commit()
+    return 0
+
+
+def cmd_install(args):
+    """Replace or add the sections of args.files in the credentials file, in place where they fit"""
+    writer = SectionWriter(output_location(args), index=slot_index(args), in_place=in_place(args))
+    try:
+        for path in args.files:
+            with open(path) as f1:
+                for name, text in iter_blocks(f1):
+                    if name is not None:
+                        writer.add(name, '\n' + text.strip('\n') + '\n')
+        writer.commit()
+    except OSError as e:
+        std_logger('Unable to install credentials sections: {}'.format(e), 'ERROR')
+        return E_BADARG
+    finally:
+        writer.close()
+    return 0
+
+
+def mint_on_demand(args, index, names):
+    """
+    Summary:
+        Mint profiles outside an account list run, each with the cached
+        session of its principal: args.principal, else the principal the
+        profile was registered with by a lazy run, else the source_profile
+        at the root of its role chain.  New sections are written back in
+        place and recorded in the credential state; an earlier expiration
+        lowers the one read by the gcreds monitor
+    Args:
+        :index (SectionIndex): section index of the gcreds credentials file
+        :names (list): profile names, without the gcreds- prefix
+    Returns:
+        TYPE: dict, {profile: credentials | STSError}
+    """
+    profiles = load_index(args.config_file, args.credentials_file, args.index_file)
+    try:
+        registered = dict(read_accounts(args.registry))
+    except OSError:
+        registered = {}
+    results, sessions, accounts = {}, {}, []
+    for profile in names:
+        if '/' in profile or not profiles.get(profile, {}).get('role_arn'):
+            results[profile] = STSError('ProfileNotFound', 'no role_arn in local config for ' + profile)
+            continue
+        try:
+            chain = role_chain(profiles, profile)
+        except STSError as e:
+            results[profile] = e
+            continue
+        principal = (
+            args.principal or registered.get(profile) or profiles.get(chain[-1], {}).get('source_profile')
+        )
+        if principal and principal not in sessions:
+            text = index.read(PREFIX + principal)
+            sessions[principal] = section_keys(text) if text else None
+        if not sessions.get(principal):
+            results[profile] = STSError('SessionNotFound', 'no session credentials for {}{}'.format(PREFIX, principal))
+            continue
+        accounts.append((profile, principal))
+    if not accounts:
+        return results
+
+    minted = {}
+    writer = SectionWriter(output_location(args), index=index if in_place(args) else None, in_place=in_place(args))
+
+    def on_result(entry, outcome):
+        profile = entry[0]
+        results[profile] = outcome
+        if not isinstance(outcome, STSError):
+            writer.add(PREFIX + profile, profile_section(PREFIX + profile, outcome))
+            credential_state.record(minted, PREFIX + profile, outcome)
+
+    try:
+        mint_roles(
+            sessions, accounts, profiles, args.duration,
+            endpoint_resolver(args, profiles), on_result, args.concurrency
+        )
+        writer.commit()
+    finally:
+        writer.close()
+    if minted:
+        credential_state.update_state(args.state_file, minted)
+        if args.expiration_file:
+            credential_state.lower_expiration(args.expiration_file, min(e['expiration'] for e in minted.values()))
+    return results
+
+
+def cmd_provide(args):
+    """
+    Summary:
+        credential_process provider behind 'gcreds --credential-process'.
+        Answers from the gcreds credentials file, read at the section's
+        offset, unless the credentials are missing or expire within
+        args.refresh_window; then the role is minted on demand.  Either
+        way the process cache entry is renewed so the next call is
+        answered by the fast path, and the request is recorded in the
+        usage history with the fast path's access log
+    """
+    name = PREFIX + args.profile
+    if '/' in args.profile:
+        sys.stderr.write('gcreds: invalid profile name [{}]\n'.format(args.profile))
+        return E_BADPROFILE
+    try:
+        # the runtime directory holds the gcreds credentials file and the answers of the fast path
+        credential_state.private_directory(os.path.dirname(args.process_cache))
+    except OSError as e:
+        sys.stderr.write('gcreds: unable to use the process cache: {}\n'.format(e))
+        return E_BADARG
+    index = sections_index(args)
+    state = credential_state.load_state(args.state_file)
+    credentials = None
+    if credential_state.remaining(state, name) > args.refresh_window:
+        text = index.read(name)
+        credentials = section_keys(text) if text else None
+        expiration = state[name]['expiration']
+
+    if credentials is None:
+        credentials = mint_on_demand(args, index, [args.profile])[args.profile]
+        if isinstance(credentials, STSError):
+            sys.stderr.write('gcreds: unable to provide [{}]: {}\n'.format(name, credentials))
+            if credentials.code == 'SessionNotFound':
+                sys.stderr.write('gcreds: run gcreds to start a session first\n')
+            return E_BADPROFILE if credentials.code in ('ProfileNotFound', 'InvalidConfiguration') else E_AUTHFAIL
+        expiration = credential_state.parse_expiration(credentials['Expiration'])
+
+    credential_state.save_process_entry(args.process_cache, args.profile, credentials, expiration)
+    print(credential_state.process_output(credentials, expiration))
+    record_usage(args, [(args.profile, time.time())])
+    return 0
+
+
+def record_usage(args, visits):
+    """Add visits, (profile, epoch) pairs, and the fast path's access log to the usage history"""
+    try:
+        with credential_state.locked(args.usage_file):
+            usage = profile_usage.load_usage(args.usage_file)
+            profile_usage.fold_accesses(args.access_log, usage)
+            for profile, epoch in visits:
+                profile_usage.touch(usage, profile, epoch)
+            profile_usage.save_usage(args.usage_file, usage)
+    except OSError as e:
+        std_logger('Unable to record profile usage: {}'.format(e), 'WARN')
+
+
+def load_store(args):
+    """{profile: (credentials, expiration)} of every role minted into the gcreds credentials file"""
+    state = credential_state.load_state(args.state_file)
+    return dict(
+        (name[len(PREFIX):], (credentials, state[name]['expiration']))
+        for name, credentials in read_keys(output_location(args)).items()
+        if name.startswith(PREFIX) and name in state
+    )
+
+
+def credential_store(args):
+    """
+    Summary:
+        Credential store of the gcreds credentials file; profiles are minted
+        on demand.  Requests are added to the usage history, which seeds the
+        store's view of the profiles in use
+    """
+    # a fresh index for every mint: other gcreds runs rewrite the file while the store is up
+    store = CredentialStore(
+        lambda: load_store(args), lambda names: mint_on_demand(args, sections_index(args), names), args.refresh_window,
+        args.hot_window, lambda visits: record_usage(args, visits)
+    )
+    usage = profile_usage.load_usage(args.usage_file)
+    store.accessed.update((profile, entry.get('used', 0)) for profile, entry in usage.items())
+    return store
+
+
+def cmd_serve(args):
+    """
+    Summary:
+        Serve every gcreds profile from one in-memory store, refreshed in
+        the background, on a loopback container credentials endpoint and
+        a unix socket broker, until interrupted
+    """
+    store = credential_store(args)
+    try:
+        server = ContainerCredentialsServer((args.bind, args.port), store, load_token(args.token_file))
+        broker = CredentialBroker(args.socket, store)
+    except (OSError, OverflowError) as e:
+        # OverflowError: port outside 0-65535
+        std_logger('Unable to start credentials endpoint: {}'.format(e), 'ERROR')
+        return E_BADARG
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # daemon managers stop with SIGTERM; shut down as on ctrl+c
+    signal.signal(signal.SIGTERM, stop)
+    store.start()
+    threading.Thread(target=broker.serve_forever, name='gcreds-broker', daemon=True).start()
+    std_logger('Serving {} profiles on http://{}:{}/ and {}'.format(
+        len(store.entries), args.bind, server.server_port, args.socket)
+    )
+    print('export AWS_CONTAINER_CREDENTIALS_FULL_URI=http://{}:{}/<profile>'.format(args.bind, server.server_port))
+    print('export AWS_CONTAINER_AUTHORIZATION_TOKEN=$(cat {})'.format(args.token_file))
+    print('broker socket: {}'.format(args.socket))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.shutdown()
+        broker.server_close()
+        server.server_close()
+        store.stop()
+        record_usage(args, store.drain_visits())
+        std_logger('Credential broker stats: {}'.format(json.dumps(broker.stats())))
+    return 0
+
+
+def cmd_fetch(args):
+    """Print the broker response for the credentials of args.profiles, fetched in one request"""
+    try:
+        print(json.dumps(broker_fetch(args.profiles, args.socket)))
+    except OSError as e:
+        sys.stderr.write('gcreds: credential broker not reachable at {}: {}\n'.format(args.socket, e))
+        return E_BADARG
+    return 0
+
+
+def cmd_list(args):
+    """Print the section names of the credentials file starting with args.prefix, from the section index"""
+    for name in sections_index(args).names(args.prefix):
+        print(name)
+    return 0
+
+
+def cmd_clean(args):
+    """
+    Summary:
+        Remove every gcreds section from the credentials file and, with
+        --process-config, every [profile gcreds-<profile>] stanza from the
+        awscli config file, keeping all other sections as they are now
+    """
+    cleanup = [(output_location(args), lambda name: name.startswith(PREFIX))]
+    if args.process_config:
+        cleanup.append((args.process_config, lambda name: name.startswith('profile ' + PREFIX)))
+    for path, drop in cleanup:
+        if not os.path.exists(path):
+            continue
+        try:
+            index = sections_index(args) if path == output_location(args) else None
+            SectionWriter(path, index=index, drop=drop).commit()
+        except OSError as e:
+            std_logger('Unable to clean {}: {}'.format(path, e), 'ERROR')
+            return E_BADARG
+    return 0
+
+
+def cmd_principals(args):
+    """Print each iam user other than args.profile named in the account list, once"""
+    seen = set([args.profile])
+    try:
+        for _, principal in read_accounts(args.accounts, args.profile):
+            if principal not in seen:
+                seen.add(principal)
+                print(principal)
+    except OSError as e:
+        std_logger('Unable to read account list: {}'.format(e), 'ERROR')
+        return E_BADARG
+    return 0
+
+
+def register_lazy(args, profiles):
+    """
+    Summary:
+        Register every profile of the account list for minting on first
+        use: its principal is recorded in args.registry and, with
+        --process-config, a credential_process stanza is added for it.
+        Nothing is minted
+    Returns:
+        TYPE: int, number of profiles registered
+    """
+    entries = list(read_accounts(args.accounts, args.profile))
+    tmp = '{}.{}.tmp'.format(args.registry, os.getpid())
+    with open(tmp, 'w') as f1:
+        f1.write(''.join('{} {}\n'.format(profile, principal) for profile, principal in entries))
+    os.replace(tmp, args.registry)
+    if args.process_config:
+        stanzas = SectionWriter(args.process_config)
+        try:
+            for profile, _ in entries:
+                if PREFIX + profile not in profiles:
+                    stanzas.add('profile ' + PREFIX + profile, process_stanza(args, profile))
+            stanzas.commit()
+        finally:
+            stanzas.close()
+    return len(entries)
+
+
+def refresh_targets(args, state, usage, now):
+    """
+    Summary:
+        Expirations upcoming refreshes must meet: those of every profile in
+        the credential state whose credentials are still valid or, driven
+        by usage, those of the hot profiles and the start of the next hour
+        profiles are pre-minted for.  Taken from the whole state, not the
+        account list of the run: a --retry-failed run lists only the
+        profiles that failed
+    Returns:
+        TYPE: list, (epoch, profile) pairs; profile is None for a prefetch hour
+    """
+    minted = [
+        (entry['expiration'], name[len(PREFIX):]) for name, entry in sorted(state.items())
+        if name.startswith(PREFIX) and entry['expiration'] > now
+    ]
+    if usage is None:
+        return minted
+    targets = [(epoch, p) for epoch, p in minted if profile_usage.recent(usage, p, now - args.hot_window)]
+    prefetch = profile_usage.next_prefetch(usage, list(usage), now + (args.refresh_window or 0))
+    if prefetch is not None:
+        targets.append((prefetch, None))
+    return targets
+
+
+def save_monitor_expiration(args, state, usage, now):
+    """
+    Summary:
+        Write the expiration shown by the gcreds monitor: the earliest of
+        the refresh targets; with none driven by usage, the end of the hot
+        window
+    """
+    if not args.expiration_file:
+        return
+    targets = refresh_targets(args, state, usage, now)
+    if targets:
+        credential_state.save_expiration(args.expiration_file, min(epoch for epoch, _ in targets))
+    elif usage is not None:
+        credential_state.save_expiration(args.expiration_file, int(now + args.hot_window))
+
+
+def cmd_roles(args):
+    """
+    Summary:
+        AssumeRole for every profile in args.accounts using the gcreds
+        session credentials of its principal.  With args.lazy, profiles are
+        registered for minting on first use instead.  With args.lazy or
+        args.hot_window, refreshes follow the usage history: profiles used
+        within the hot window and those predicted in use at the coming
+        hour of the day are minted when missing or due, all others lapse
+    """
+    profiles = load_index(args.config_file, args.credentials_file, args.index_file)
+    keys = load_keys(args)
+    if PREFIX + args.profile not in keys:
+        std_logger('No session credentials found for [{}]'.format(PREFIX + args.profile), 'ERROR')
+        return E_AUTHFAIL
+    sessions = dict((name[len(PREFIX):], c) for name, c in keys.items() if name.startswith(PREFIX))
+    present = set(keys)
+    if args.process_cache:
+        try:
+            credential_state.private_directory(os.path.dirname(args.process_cache))
+        except OSError as e:
+            std_logger('Unable to use the process cache: {}'.format(e), 'ERROR')
+            return E_BADARG
+
+    state = credential_state.load_state(args.state_file)
+    now = time.time()
+    usage = None
+    if args.lazy or args.hot_window is not None:
+        args.hot_window = args.hot_window or HOT_WINDOW
+        with credential_state.locked(args.usage_file):
+            usage = profile_usage.load_usage(args.usage_file)
+            profile_usage.fold_accesses(args.access_log, usage)
+            profile_usage.save_usage(args.usage_file, usage)
+    # profiles in use at the hour this refresh prepares for
+    upcoming = now + (args.refresh_window or 0)
+
+    def accounts():
+        for profile, principal in read_accounts(args.accounts, args.profile):
+            name = PREFIX + profile
+            if usage is not None:
+                # hot and predicted profiles; cold ones wait for a consumer to ask
+                if name in present and not credential_state.due(state, name, args.refresh_window or 0):
+                    continue
+                if profile_usage.recent(usage, profile, now - args.hot_window) \
+                        or profile_usage.predicted(usage, profile, upcoming):
+                    yield profile, principal
+            elif args.refresh_window is None:
+                yield profile, principal
+            elif name not in present or credential_state.due(state, name, args.refresh_window):
+                yield profile, principal
+
+    try:
+        if args.lazy:
+            std_logger('Registered {} profiles for minting on first use'.format(register_lazy(args, profiles)))
+        total = sum(1 for _ in accounts())
+    except OSError as e:
+        std_logger('Unable to read account list: {}'.format(e), 'ERROR')
+        return E_BADARG
+    if usage is not None:
+        std_logger('Refreshing {} profiles in use or predicted in use'.format(total))
+    elif args.refresh_window is not None:
+        std_logger('Refreshing {} profiles expiring within {} seconds'.format(total, args.refresh_window))
+    if not total:
+        save_monitor_expiration(args, state, usage, now)
+        return 0
+
+    progress = Progress(total)
+    # refreshes of the gcreds credentials file rewrite only the slots of the profiles renewed
+    partial = args.refresh_window is not None or usage is not None
+    writer = SectionWriter(output_location(args), index=slot_index(args), in_place=partial and in_place(args))
+    # lazy runs registered the stanzas of every profile already
+    stanzas = SectionWriter(args.process_config) if args.process_config and not args.lazy else None
+
+    failed = []
+    renewed = {}
+
+    def on_result(entry, outcome):
+        profile = entry[0]
+        progress.update(profile, outcome)
+        if isinstance(outcome, STSError):
+            failed.append(entry)
+        else:
+            writer.add(PREFIX + profile, profile_section(PREFIX + profile, outcome))
+            credential_state.record(state, PREFIX + profile, outcome, now)
+            renewed[PREFIX + profile] = state[PREFIX + profile]
+            if args.process_cache:
+                credential_state.save_process_entry(
+                    args.process_cache, profile, outcome, state[PREFIX + profile]['expiration']
+                )
+            if stanzas and PREFIX + profile not in profiles:
+                stanzas.add('profile ' + PREFIX + profile, process_stanza(args, profile))
+
+    try:
+        limiter, calls = mint_roles(
+            sessions, accounts(), profiles, args.duration,
+            endpoint_resolver(args, profiles), on_result, args.concurrency
+        )
+        progress.finish()
+        writer.commit()
+        if stanzas:
+            stanzas.commit()
+    finally:
+        writer.close()
+        if stanzas:
+            stanzas.close()
+
+    failures = report(progress, limiter, calls)
+    if args.failed_list:
+        update_failed_list(args.failed_list, failed)
+    state = credential_state.update_state(args.state_file, renewed)
+    save_monitor_expiration(args, state, usage, now)
+    return 1 if failures else 0
+
+
+def cmd_schedule(args):
+    """
+    Summary:
+        Event source of the gcreds monitor.  Sleeps until the next deadline
+        and prints one line for it, '<event> <session seconds left>
+        <credential seconds left>', then waits for a line on stdin (the
+        monitor has handled the event) and reloads the deadlines:
+
+            display     redraw the credential stats (every DISPLAY_INTERVAL)
+            refresh     credentials are due within the refresh window
+            end         the session cannot renew credentials any longer;
+                        driven by usage, the session has expired
+
+        Refresh deadlines follow the same targets as 'roles' refreshes,
+        including usage and prefetch hours with --hot-window
+    """
+    def deadlines():
+        now = time.time()
+        session = credential_state.load_expiration(args.session_file)
+        if session is None:
+            return [(now, 'end', None)]
+        state = credential_state.load_state(args.state_file)
+        usage = None
+        if args.hot_window is not None:
+            usage = profile_usage.load_usage(args.usage_file)
+            profile_usage.fold_accesses(args.access_log, usage, keep=True)
+        targets = refresh_targets(args, state, usage, now)
+        # credentials of a full lifetime need a session outlasting them
+        cutoff = session - args.lifetime
+        events = [
+            (epoch - args.refresh_window, 'refresh', profile) for epoch, profile in targets
+            if epoch - args.refresh_window < cutoff
+        ]
+        if usage is not None:
+            # profiles are minted on request for as long as the session lasts
+            events.append((session, 'end', None))
+        else:
+            expirations = [epoch for epoch, _ in targets]
+            events.append((max(cutoff, min(expirations)) if expirations else cutoff, 'end', None))
+        return events
+
+    def remaining(path, now):
+        return int((credential_state.load_expiration(path) or now) - now)
+
+    try:
+        scheduler = RefreshScheduler(deadlines, args.refresh_window)
+        event = 'display'
+        while True:
+            now = time.time()
+            print('{} {} {}'.format(event, remaining(args.session_file, now), remaining(args.expiration_file, now)))
+            sys.stdout.flush()
+            if event == 'end' or not sys.stdin.readline():
+                break
+            scheduler.rebuild()
+            event, _ = scheduler.next()
+    except (BrokenPipeError, KeyboardInterrupt):
+        # monitor exited
+        pass
+    except OSError as e:
+        std_logger('Unable to read the account list: {}'.format(e), 'ERROR')
+        return E_BADARG
+    return 0
+
+
+def options(parser):
+    """
+    Summary:
+        parse cli parameter options
+    Returns:
+        TYPE: argparse object, parser argument set
+    """
+    parser.add_argument("--config-file", default=config_location(), type=str, required=False)
+    parser.add_argument("--credentials-file", default=credentials_location(), type=str, required=False)
+    parser.add_argument("--output-file", default=None, type=str, required=False)
+    parser.add_argument("--index-file", default=index_location(), type=str, required=False)
+    parser.add_argument("--sections-index", default=section_index_location(), type=str, required=False)
+    parser.add_argument("--endpoint-url", default=endpoint_location(), type=str, required=False)
+    parser.add_argument("--region", default=None, type=str, required=False)
+    parser.add_argument("--sts-region", default=None, type=str, required=False)
+    parser.add_argument("--probe-cache", default=HOME + '/.gcreds/sts-endpoint.json', type=str, required=False)
+    commands = parser.add_subparsers(dest='command')
+
+    session = commands.add_parser('session')
+    session.add_argument("-p", "--profile", type=str, required=True)
+    session.add_argument("-s", "--serial", type=str, required=True)
+    session.add_argument("-c", "--code", type=str, required=True)
+    session.add_argument("-d", "--duration", type=int, required=True)
+    session.add_argument("-o", "--output", type=str, required=True)
+    session.add_argument("--expiration-file", type=str, default=None, required=False)
+    session.add_argument("--update-credentials", action='store_true', default=False, required=False)
+    session.set_defaults(func=cmd_session)
+
+    roles = commands.add_parser('roles')
+    roles.add_argument("-a", "--accounts", type=str, required=True)
+    roles.add_argument("-p", "--profile", type=str, required=True)
+    roles.add_argument("-d", "--duration", type=int, required=True)
+    roles.add_argument("-n", "--concurrency", type=int, default=1, required=False)
+    roles.add_argument("-f", "--failed-list", type=str, default=None, required=False)
+    roles.add_argument("-w", "--refresh-window", type=int, default=None, required=False)
+    roles.add_argument("--state-file", type=str, default=credential_state.state_location(), required=False)
+    roles.add_argument("--expiration-file", type=str, default=None, required=False)
+    roles.add_argument("--process-config", type=str, default=None, required=False)
+    roles.add_argument("--process-cache", type=str, default=None, required=False)
+    roles.add_argument("--provider", type=str, default='gcreds', required=False)
+    roles.add_argument("--lazy", action='store_true', default=False, required=False)
+    roles.add_argument("--hot-window", type=int, default=None, required=False)
+    roles.add_argument("--registry", type=str, default=lazy_location(), required=False)
+    roles.add_argument("--usage-file", type=str, default=profile_usage.usage_location(), required=False)
+    roles.add_argument("--access-log", type=str, default=profile_usage.access_location(), required=False)
+    roles.set_defaults(func=cmd_roles)
+
+    principals = commands.add_parser('principals')
+    principals.add_argument("-a", "--accounts", type=str, required=True)
+    principals.add_argument("-p", "--profile", type=str, required=True)
+    principals.set_defaults(func=cmd_principals)
+
+    provide = commands.add_parser('provide')
+    provide.add_argument("profile", type=str)
+    provide.add_argument("--principal", type=str, default=None, required=False)
+    provide.add_argument("-d", "--duration", type=int, default=3600, required=False)
+    provide.add_argument("-n", "--concurrency", type=int, default=1, required=False)
+    provide.add_argument("-w", "--refresh-window", type=int, default=PROCESS_WINDOW, required=False)
+    provide.add_argument("--state-file", type=str, default=credential_state.state_location(), required=False)
+    provide.add_argument("--expiration-file", type=str, default=None, required=False)
+    provide.add_argument("--registry", type=str, default=lazy_location(), required=False)
+    provide.add_argument("--usage-file", type=str, default=profile_usage.usage_location(), required=False)
+    provide.add_argument("--access-log", type=str, default=profile_usage.access_location(), required=False)
+    provide.add_argument("--process-cache", type=str, default=credential_state.process_cache_location(), required=False)
+    provide.set_defaults(func=cmd_provide)
+
+    schedule = commands.add_parser('schedule')
+    schedule.add_argument("-w", "--refresh-window", type=int, required=True)
+    schedule.add_argument("-l", "--lifetime", type=int, required=True)
+    schedule.add_argument("--session-file", type=str, required=True)
+    schedule.add_argument("--expiration-file", type=str, required=True)
+    schedule.add_argument("--state-file", type=str, default=credential_state.state_location(), required=False)
+    schedule.add_argument("--hot-window", type=int, default=None, required=False)
+    schedule.add_argument("--usage-file", type=str, default=profile_usage.usage_location(), required=False)
+    schedule.add_argument("--access-log", type=str, default=profile_usage.access_location(), required=False)
+    schedule.set_defaults(func=cmd_schedule)
+
+    install = commands.add_parser('install')
+    install.add_argument("files", nargs='+', type=str)
+    install.set_defaults(func=cmd_install)
+
+    serve = commands.add_parser('serve')
+    serve.add_argument("--bind", type=str, default='127.0.0.1', required=False)
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, required=False)
+    serve.add_argument("--principal", type=str, default=None, required=False)
+    serve.add_argument("-d", "--duration", type=int, default=3600, required=False)
+    serve.add_argument("-n", "--concurrency", type=int, default=10, required=False)
+    serve.add_argument("-w", "--refresh-window", type=int, default=PROCESS_WINDOW, required=False)
+    serve.add_argument("--hot-window", type=int, default=None, required=False)
+    serve.add_argument("--state-file", type=str, default=credential_state.state_location(), required=False)
+    serve.add_argument("--expiration-file", type=str, default=None, required=False)
+    serve.add_argument("--registry", type=str, default=lazy_location(), required=False)
+    serve.add_argument("--usage-file", type=str, default=profile_usage.usage_location(), required=False)
+    serve.add_argument("--access-log", type=str, default=profile_usage.access_location(), required=False)
+    serve.add_argument("--token-file", type=str, default=token_location(), required=False)
+    serve.add_argument("--socket", type=str, default=broker_location(), required=False)
+    serve.set_defaults(func=cmd_serve)
+
+    fetch = commands.add_parser('fetch')
+    fetch.add_argument("profiles", nargs='+', type=str)
+    fetch.add_argument("--socket", type=str, default=broker_location(), required=False)
+    fetch.set_defaults(func=cmd_fetch)
+
+    listing = commands.add_parser('list')
+    listing.add_argument("--prefix", type=str, default='', required=False)
+    listing.set_defaults(func=cmd_list)
+
+    clean = commands.add_parser('clean')
+    clean.add_argument("--process-config", type=str, default=None, required=False)
+    clean.set_defaults(func=cmd_clean)
+    return parser.parse_args()
+
+
+def init_cli():
+    parser = argparse.ArgumentParser()
+    args = options(parser)
+    if not args.command:
+        parser.print_help()
+        return E_BADARG
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(init_cli())
@@ -0,0 +1,242 @@
+"""
+Summary:
+    Loopback endpoint serving the gcreds credential store in the AWS
+    container credentials format, one path per profile:
+
+        GET http://127.0.0.1:<port>/<profile>
+        Authorization: <token>
+
+    Clients set AWS_CONTAINER_CREDENTIALS_FULL_URI to the url of a profile
+    and AWS_CONTAINER_AUTHORIZATION_TOKEN to the token kept in
+    ~/.gcreds/serve.token (owner access only).  Requests are answered from
+    memory; the filesystem and STS are only touched by the store's
+    background refresh and by the first request for a profile not yet
+    minted.
+
+    CredentialBroker serves the same store on a unix domain socket (mode
+    0600, owner access only) to tools that need credentials of many
+    profiles at once.  Each request is one json line and is answered with
+    one json line; a connection may carry any number of requests:
+
+        {"profiles": ["<profile>", ...]}
+        {"credentials": {"<profile>": {<credential_process json>}, ...},
+         "errors": {"<profile>": {"code": ..., "message": ...}},
+         "latency_ms": <server side time of this request>}
+
+        {"stats": true}
+        {"requests": n, "profiles": n, "p50_ms": ..., "p99_ms": ..., "max_ms": ...}
+
+    Profiles not yet minted are minted together in one batch.
+"""
+import collections
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from credential_state import private_directory, process_document, runtime_location
+
+
+DEFAULT_PORT = 9911
+LATENCY_WINDOW = 4096       # recent broker requests kept for latency percentiles
+
+
+def token_location():
+    return os.environ['HOME'] + '/.gcreds/serve.token'
+
+
+def broker_location():
+    """Broker socket, next to the process cache (tmpfs where available)"""
+    return os.path.join(runtime_location(), 'broker.sock')
+
+
+def load_token(path):
+    """Authorization token clients must present; generated on first use"""
+    try:
+        with open(path) as f1:
+            token = f1.read().strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f1:
+        f1.write(token + '\n')
+    return token
+
+
+def container_output(credentials, expiration):
+    """Body of a container credentials response"""
+    return json.dumps({
+        'AccessKeyId': credentials['AccessKeyId'],
+        'SecretAccessKey': credentials['SecretAccessKey'],
+        'Token': credentials['SessionToken'],
+        'Expiration': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(expiration))
+    }).encode()
+
+
+class ContainerCredentialsHandler(BaseHTTPRequestHandler):
+    """GET /<profile> with the endpoint token; keep-alive connections are reused by sdk clients"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'gcreds'
+    # headers and body are separate writes; avoid the delayed-ack stall on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        token = self.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(token, self.server.token):
+            self._reply(403, {'code': 'AccessDenied', 'message': 'invalid authorization token'})
+            return
+        profile = self.path.split('?', 1)[0].strip('/')
+        try:
+            credentials, expiration = self.server.store.get(profile)
+        except Exception as e:
+            code = getattr(e, 'code', 'ServiceUnavailable')
+            self._reply(404 if code in ('ProfileNotFound', 'InvalidConfiguration') else 503, {
+                'code': code, 'message': str(e)
+            })
+            return
+        self._send(200, container_output(credentials, expiration))
+
+    def _reply(self, status, error):
+        self._send(status, json.dumps(error).encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # no per-request logging on the hot path
+        pass
+
+
+class ContainerCredentialsServer(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Args:
+        :address (tuple): (host, port) to listen on
+        :store (CredentialStore): credentials served
+        :token (str): authorization token clients must present
+    """
+    daemon_threads = True
+
+    def __init__(self, address, store, token):
+        super().__init__(address, ContainerCredentialsHandler)
+        self.store = store
+        self.token = token.encode()
+
+
+class CredentialBrokerHandler(socketserver.StreamRequestHandler):
+    """json line requests for the credentials of many profiles at once"""
+
+    def handle(self):
+        for line in self.rfile:
+            start = time.perf_counter()
+            try:
+                request = json.loads(line.decode())
+            except ValueError:
+                request = None
+            if not isinstance(request, dict):
+                self._reply({'errors': {'': {'code': 'InvalidRequest', 'message': 'request is not a json object'}}})
+                continue
+            if request.get('stats'):
+                self._reply(self.server.stats())
+                continue
+            profiles = request.get('profiles')
+            if not isinstance(profiles, list) or not all(isinstance(p, str) for p in profiles):
+                self._reply({'errors': {'': {'code': 'InvalidRequest', 'message': 'profiles must be a list of names'}}})
+                continue
+            try:
+                found, errors = self.server.store.get_many(profiles)
+            except Exception as e:
+                found, errors = {}, dict((profile, e) for profile in profiles)
+            response = {
+                'credentials': dict(
+                    (profile, process_document(credentials, expiration))
+                    for profile, (credentials, expiration) in found.items()
+                ),
+                'errors': dict(
+                    (profile, {'code': getattr(e, 'code', 'Error'), 'message': str(e)})
+                    for profile, e in errors.items()
+                )
+            }
+            latency = (time.perf_counter() - start) * 1000
+            response['latency_ms'] = round(latency, 3)
+            self._reply(response)
+            self.server.record(len(profiles), latency)
+
+    def _reply(self, response):
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+        self.wfile.flush()
+
+
+class CredentialBroker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Args:
+        :path (str): unix socket path; created with mode 0600
+        :store (CredentialStore): credentials served
+    """
+    daemon_threads = True
+
+    def __init__(self, path, store):
+        private_directory(os.path.dirname(path))
+        if os.path.exists(path):
+            os.remove(path)
+        self.store = store
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.profiles = 0
+        self._lock = threading.Lock()
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, CredentialBrokerHandler)
+        finally:
+            os.umask(umask)
+
+    def record(self, profiles, latency):
+        with self._lock:
+            self.requests += 1
+            self.profiles += profiles
+            self.latencies.append(latency)
+
+    def stats(self):
+        """Request counts and latency percentiles (ms) of recent requests"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            stats = {'requests': self.requests, 'profiles': self.profiles}
+        if latencies:
+            stats.update({
+                'p50_ms': round(latencies[len(latencies) // 2], 3),
+                'p99_ms': round(latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)], 3),
+                'max_ms': round(latencies[-1], 3)
+            })
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def broker_fetch(profiles, path=None):
+    """
+    Summary:
+        Credentials of several profiles from a running broker in one request
+    Returns:
+        TYPE: dict, broker response ('credentials', 'errors', 'latency_ms')
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path or broker_location())
+        conn.sendall(json.dumps({'profiles': list(profiles)}).encode() + b'\n')
+        with conn.makefile('rb') as f1:
+            return json.loads(f1.readline().decode())
+    finally:
+        conn.close()
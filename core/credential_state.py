@@ -0,0 +1,190 @@
+"""
+Summary:
+    Per-profile credential state for gcreds.
+
+    Records the expiration returned by STS for each temporary credential
+    gcreds writes, so refreshes can select only the profiles close to
+    expiry.  State is a json document in ~/.gcreds/credential.state:
+
+        {"<profile>": {"expiration": <epoch>, "minted": <epoch>}, ...}
+
+    The process cache holds one file per profile for the credential_process
+    fast path of gcreds: the expiration (epoch) on the first line and the
+    credential_process json on the second, so the provider answers with two
+    shell 'read' builtins.  The cache, the access log and the broker socket
+    share a runtime directory at a predictable name in world writable
+    /dev/shm; it is used only if it is a directory of the current user with
+    mode 0700, so no other user can plant answers or replace the socket.
+"""
+import calendar
+import contextlib
+import errno
+import fcntl
+import json
+import os
+import stat
+import time
+
+
+def state_location():
+    return os.environ['HOME'] + '/.gcreds/credential.state'
+
+
+def runtime_location():
+    """Runtime directory of gcreds; on tmpfs where available, matching the gcreds fast path"""
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm/gcreds-{}'.format(os.getuid())
+    return os.environ['HOME'] + '/.gcreds/run'
+
+
+def process_cache_location():
+    return os.path.join(runtime_location(), 'process')
+
+
+def private_directory(path):
+    """
+    Summary:
+        Create directory path with mode 0700 if missing, then make sure it
+        is private: not a symlink, owned by the current user and closed to
+        group and others
+    Returns:
+        TYPE: str, path
+    Raises:
+        PermissionError: path exists but is not private
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(errno.EPERM, 'must be a directory of uid {} with mode 0700'.format(os.getuid()), path)
+    return path
+
+
+def parse_expiration(value):
+    """Epoch seconds of an STS Expiration timestamp (ISO 8601, UTC)"""
+    stamp = value.strip().replace('+00:00', 'Z')
+    if '.' in stamp:
+        stamp = stamp.split('.')[0] + 'Z'
+    return calendar.timegm(time.strptime(stamp, '%Y-%m-%dT%H:%M:%SZ'))
+
+
+def load_state(path):
+    try:
+        with open(path) as f1:
+            state = json.load(f1)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Exclusive lock for a read-modify-write of path, held on path + '.lock'"""
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def save_state(path, state):
+    """Write state atomically, readable by the owner only"""
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f1:
+        json.dump(state, f1, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def update_state(path, updates):
+    """
+    Summary:
+        Merge the entries of updates into the state saved at path; concurrent
+        runs each keep the profiles they minted
+    Returns:
+        TYPE: dict, the merged state
+    """
+    with locked(path):
+        state = load_state(path)
+        state.update(updates)
+        save_state(path, state)
+    return state
+
+
+def record(state, profile, credentials, now=None):
+    """Store the expiration of newly minted credentials for profile"""
+    state[profile] = {
+        'expiration': parse_expiration(credentials['Expiration']),
+        'minted': int(now or time.time())
+    }
+
+
+def remaining(state, profile, now=None):
+    """Seconds until the credentials of profile expire; 0 if unknown"""
+    entry = state.get(profile)
+    if not entry:
+        return 0
+    return max(0, int(entry['expiration'] - (now or time.time())))
+
+
+def due(state, profile, window, now=None):
+    """True if profile has no credentials or they expire within window seconds"""
+    return remaining(state, profile, now) <= window
+
+
+def load_expiration(path):
+    """Expiration (epoch) last written by save_expiration; None if missing"""
+    try:
+        with open(path) as f1:
+            return int(f1.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def save_expiration(path, expiration):
+    """Write the earliest expiration (epoch) read by the gcreds monitor, atomically"""
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f1:
+        f1.write('{}\n'.format(expiration))
+    os.replace(tmp, path)
+
+
+def lower_expiration(path, expiration):
+    """Lower the expiration (epoch) read by the gcreds monitor to expiration if it is earlier"""
+    with locked(path):
+        current = load_expiration(path)
+        if current is None or expiration < current:
+            save_expiration(path, expiration)
+
+
+def process_output(credentials, expiration=None):
+    """credential_process json of credentials; expiration in epoch seconds"""
+    return json.dumps(process_document(credentials, expiration))
+
+
+def process_document(credentials, expiration=None):
+    """credential_process document of credentials, as a dict"""
+    output = {
+        'Version': 1,
+        'AccessKeyId': credentials['AccessKeyId'],
+        'SecretAccessKey': credentials['SecretAccessKey'],
+        'SessionToken': credentials['SessionToken']
+    }
+    if expiration:
+        output['Expiration'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(expiration))
+    return output
+
+
+def save_process_entry(directory, profile, credentials, expiration):
+    """Write the process cache entry of profile atomically, readable by the owner only"""
+    private_directory(os.path.dirname(directory))
+    private_directory(directory)
+    path = os.path.join(directory, profile)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f1:
+        f1.write('{}\n{}\n'.format(int(expiration), process_output(credentials, expiration)))
+    os.replace(tmp, path)
@@ -0,0 +1,181 @@
+"""
+Summary:
+    In-memory store of gcreds temporary credentials.
+
+    Serving paths (the container credentials endpoint, the credential
+    broker) answer from this store rather than the credentials file or
+    STS.  The store is loaded once from the gcreds credentials file and
+    a background thread re-mints every entry shortly before it expires,
+    sleeping until the earliest expiration in between.  A profile not yet
+    in the store is minted on first request; concurrent requests for the
+    same profile share one mint.
+
+    With a hot window only entries requested within it are re-minted in
+    the background; the others lapse and are minted again when next
+    requested.
+"""
+import threading
+import time
+from credential_state import parse_expiration
+
+
+REFRESH_WINDOW = 300        # seconds, entries expiring this soon are re-minted
+RETRY_INTERVAL = 30         # seconds, wait before retrying a failed background refresh
+
+
+class CredentialStore():
+    """
+    Temporary credentials by profile name, kept fresh in the background
+
+    Args:
+        :load (function): returns {profile: (credentials, expiration epoch)}
+            of the credentials already minted
+        :mint (function): mints a list of profiles, returning
+            {profile: credentials | Exception}; credentials carry the STS
+            'Expiration' timestamp
+        :window (int): seconds before expiry at which entries are re-minted
+        :hot_window (int): when set, only entries requested within this many
+            seconds are re-minted in the background
+        :record (function): called after each background refresh with the
+            (profile, epoch) visits collected since the last call
+    """
+    def __init__(self, load, mint, window=REFRESH_WINDOW, hot_window=None, record=None):
+        self.mint = mint
+        self.window = window
+        self.hot_window = hot_window
+        self.record = record
+        self.entries = {}           # profile: (credentials, expiration epoch)
+        self.failed = {}            # profile: epoch of the last failed refresh
+        self.accessed = {}          # profile: epoch of the last request
+        self.visits = []            # (profile, epoch) of the first request of a profile each hour
+        self._mint_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.entries.update(load())
+
+    def _put(self, profile, credentials):
+        self.entries[profile] = (credentials, parse_expiration(credentials['Expiration']))
+        self.failed.pop(profile, None)
+
+    def _fresh(self, profile, now=None):
+        entry = self.entries.get(profile)
+        return entry is not None and entry[1] - (now or time.time()) > self.window
+
+    def _hot(self, profile, now):
+        return self.hot_window is None or self.accessed.get(profile, 0) >= now - self.hot_window
+
+    def _access(self, profiles, now):
+        """Record requests; a profile turning hot gets a refresh deadline, so the refresh thread is woken"""
+        turned_hot = False
+        for profile in profiles:
+            last = self.accessed.get(profile, 0)
+            turned_hot = turned_hot or not self._hot(profile, now)
+            self.accessed[profile] = now
+            if last // 3600 != now // 3600:
+                self.visits.append((profile, now))
+        if turned_hot:
+            self._wake.set()
+
+    def drain_visits(self):
+        """(profile, epoch) of first requests per hour since the last call"""
+        visits, self.visits = self.visits, []
+        return visits
+
+    def _mint(self, profiles):
+        """Mint profiles one batch at a time; returns {profile: error} of failures"""
+        with self._mint_lock:
+            # another caller may have minted them while this one waited
+            profiles = [profile for profile in profiles if not self._fresh(profile)]
+            errors = {}
+            if profiles:
+                for profile, outcome in self.mint(profiles).items():
+                    if isinstance(outcome, Exception):
+                        errors[profile] = outcome
+                    else:
+                        self._put(profile, outcome)
+            return errors
+
+    def get(self, profile):
+        """
+        Summary:
+            Credentials of profile, minted first when missing or expiring
+        Returns:
+            TYPE: tuple, (credentials, expiration epoch)
+        Raises:
+            Exception returned by mint when profile cannot be minted
+        """
+        self._access([profile], time.time())
+        if not self._fresh(profile):
+            error = self._mint([profile]).get(profile)
+            if error is not None:
+                raise error
+            self._wake.set()
+        return self.entries[profile]
+
+    def get_many(self, profiles):
+        """
+        Summary:
+            Credentials of several profiles; those missing or expiring are
+            minted together in one batch
+        Returns:
+            TYPE: tuple, ({profile: (credentials, expiration)}, {profile: error})
+        """
+        self._access(profiles, time.time())
+        stale = [profile for profile in profiles if not self._fresh(profile)]
+        errors = self._mint(stale) if stale else {}
+        if stale:
+            self._wake.set()
+        found = dict(
+            (profile, self.entries[profile]) for profile in profiles
+            if profile not in errors and profile in self.entries
+        )
+        return found, errors
+
+    def due(self, now=None):
+        """Hot profiles expiring within the refresh window, skipping recent failures"""
+        now = now or time.time()
+        return [
+            profile for profile, (_, expiration) in list(self.entries.items())
+            if expiration - now <= self.window and now - self.failed.get(profile, 0) >= RETRY_INTERVAL
+            and self._hot(profile, now)
+        ]
+
+    def next_refresh(self, now=None):
+        """Seconds until the next hot entry enters the refresh window"""
+        now = now or time.time()
+        deadlines = [
+            max(expiration - self.window, self.failed.get(profile, 0) + RETRY_INTERVAL)
+            for profile, (_, expiration) in list(self.entries.items())
+            if self._hot(profile, now)
+        ]
+        return max(0, min(deadlines) - now) if deadlines else None
+
+    def refresh(self):
+        """Re-mint every entry in the refresh window; returns {profile: error} of failures"""
+        errors = self._mint(self.due())
+        now = time.time()
+        for profile in errors:
+            self.failed[profile] = now
+        return errors
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            if self.record:
+                visits = self.drain_visits()
+                if visits:
+                    self.record(visits)
+            self._wake.clear()
+            self._wake.wait(self.next_refresh())
+
+    def start(self):
+        """Refresh entries in a background thread until stop()"""
+        self._thread = threading.Thread(target=self._run, name='gcreds-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
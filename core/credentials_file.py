@@ -0,0 +1,377 @@
+"""
+Summary:
+    Section level updates of the awscli credentials file.
+
+    New sections are staged in a temporary file, flushed in batches, and
+    swapped into the credentials file with a single atomic rename on
+    commit.  The existing file is streamed block by block (one block per
+    [section]); blocks replaced by a new section are dropped and every other
+    block is written back unchanged.  Readers see either the previous or the
+    new set of credentials, never a mix, and memory use does not grow with
+    the number of sections.
+
+    With a SectionIndex, sections are written into padded slots and the
+    byte offset and size of every section is kept in a side index
+    (~/.gcreds/sections.index).  A profile can then be replaced by
+    rewriting its slot in place, and new profiles appended, without
+    rewriting the rest of the file.  Listing sections reads the index; the
+    file is scanned only when it changed outside gcreds.  In-place writes
+    are not atomic as a set: a reader may see some sections renewed and
+    others not yet.
+
+    Every read-modify-write of a credentials file holds an exclusive flock
+    on it, so concurrent gcreds writers take turns.  Editors and awscli do
+    not take the lock; under it the file is checked against the size and
+    mtime the index was built from, and rescanned if it changed since.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import re
+import shutil
+import stat
+import tempfile
+
+
+SECTION = re.compile(r'^\s*\[([^\]]+)\]\s*$')
+RAW_SECTION = re.compile(rb'^\s*\[([^\]]+)\]\s*$')
+BATCH_SIZE = 500        # sections buffered before a flush to the staging file
+SLOT_ALIGN = 512        # bytes, slot sizes are multiples of SLOT_ALIGN
+SLOT_HEADROOM = 128     # bytes, minimum room left in a slot for longer tokens
+
+
+def section_index_location():
+    return os.environ['HOME'] + '/.gcreds/sections.index'
+
+
+@contextlib.contextmanager
+def locked(path):
+    """
+    Summary:
+        Hold an exclusive flock on path, created if missing, for the
+        duration of a read-modify-write
+    Returns:
+        TYPE: context manager yielding the locked file descriptor
+    """
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        # replaced by a rename while waiting; lock the new file
+        os.close(fd)
+    try:
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def iter_blocks(f1):
+    """
+    Summary:
+        Stream the blocks of an open credentials file
+    Returns:
+        TYPE: generator, (name, text) pairs; name is None for any preamble
+    """
+    name, text = None, ''
+    for line in f1:
+        match = SECTION.match(line)
+        if match:
+            if text:
+                yield name, text
+            name, text = match.group(1).strip(), line
+        else:
+            text += line
+    if text:
+        yield name, text
+
+
+def iter_raw_blocks(f1):
+    """(name, byte offset, bytes) of each block of a credentials file opened in binary mode"""
+    name, start, data, offset = None, 0, b'', 0
+    for line in f1:
+        match = RAW_SECTION.match(line)
+        if match:
+            if data:
+                yield name, start, data
+            name, start, data = match.group(1).strip().decode(), offset, line
+        else:
+            data += line
+        offset += len(line)
+    if data:
+        yield name, start, data
+
+
+def slot(section, size=None):
+    """
+    Summary:
+        Pad a section with a comment line to fill a slot
+    Args:
+        :section (bytes): section text starting with its [header]
+        :size (int): slot size; default is the next multiple of SLOT_ALIGN
+            leaving at least SLOT_HEADROOM bytes of padding
+    Returns:
+        TYPE: bytes, None if section does not fit in size
+    """
+    body = section.strip(b'\n') + b'\n'
+    if size is None:
+        size = -(-(len(body) + SLOT_HEADROOM) // SLOT_ALIGN) * SLOT_ALIGN
+    room = size - len(body)
+    if room < 0:
+        return None
+    if room < 2:
+        return body + b'\n' * room
+    return body + b'#' + b' ' * (room - 2) + b'\n'
+
+
+class SectionIndex():
+    """
+    Byte offset and size of every [section] of a credentials file
+
+    Args:
+        :path (str): credentials file; symlinks are followed
+        :index_file (str): side index shared by all files gcreds manages
+    """
+    def __init__(self, path, index_file=None):
+        self.path = os.path.realpath(path)
+        self.index_file = index_file or section_index_location()
+        self.source = None          # fingerprint of the file the sections were read from
+        self.sections = self._load()
+
+    def _fingerprint(self):
+        try:
+            st = os.stat(self.path)
+            return [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            return None
+
+    def _read_index(self):
+        try:
+            with open(self.index_file) as f1:
+                index = json.load(f1)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        entry = self._read_index().get(self.path)
+        fingerprint = self._fingerprint()
+        if entry and entry.get('source') == fingerprint:
+            self.source = fingerprint
+            return entry['sections']
+        return self.scan()
+
+    def scan(self):
+        """Rebuild the section offsets with one pass over the file"""
+        self.source = self._fingerprint()
+        sections = {}
+        try:
+            with open(self.path, 'rb') as f1:
+                for name, offset, data in iter_raw_blocks(f1):
+                    if name is not None:
+                        sections[name] = [offset, len(data)]
+        except FileNotFoundError:
+            pass
+        return sections
+
+    def save(self):
+        self.source = self._fingerprint()
+        index = self._read_index()
+        index[self.path] = {'source': self.source, 'sections': self.sections}
+        tmp = '{}.{}.tmp'.format(self.index_file, os.getpid())
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f1:
+                json.dump(index, f1)
+            os.replace(tmp, self.index_file)
+        except OSError:
+            pass
+
+    def _refresh(self):
+        """Rescan if the file changed since the sections were read; call with the file locked"""
+        if self._fingerprint() != self.source:
+            self.sections = self.scan()
+
+    def names(self, prefix=''):
+        """Section names starting with prefix, in file order"""
+        return [
+            name for name, _ in sorted(self.sections.items(), key=lambda item: item[1][0])
+            if name.startswith(prefix)
+        ]
+
+    def read(self, name):
+        """Text of section name, read at its offset; None if not in the file"""
+        for _ in range(2):
+            if name not in self.sections:
+                return None
+            offset, size = self.sections[name]
+            with open(self.path, 'rb') as f1:
+                f1.seek(offset)
+                data = f1.read(size)
+            match = RAW_SECTION.match(data.split(b'\n', 1)[0])
+            if match and match.group(1).strip().decode() == name:
+                return data.decode()
+            # file rewritten since the index was saved
+            self.sections = self.scan()
+        return None
+
+    def update(self, sections):
+        """
+        Summary:
+            Write sections into their slots in place; sections not yet in
+            the file are appended in new slots
+        Args:
+            :sections (list): (name, section bytes) pairs
+        Returns:
+            TYPE: bool, False (nothing written) if a section outgrew its slot
+        """
+        with locked(self.path):
+            return self._update(sections)
+
+    def _update(self, sections):
+        self._refresh()
+        writes = []
+        for name, section in sections:
+            if name in self.sections:
+                data = slot(section, self.sections[name][1])
+                if data is None:
+                    return False
+                writes.append((name, data))
+            else:
+                writes.append((name, slot(section)))
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            end = os.fstat(fd).st_size
+            for name, data in writes:
+                if name in self.sections:
+                    os.pwrite(fd, data, self.sections[name][0])
+                    continue
+                lead = b'\n' if end == 0 or os.pread(fd, 1, end - 1) == b'\n' else b'\n\n'
+                os.pwrite(fd, lead + data, end)
+                self.sections[name] = [end + len(lead), len(data)]
+                end += len(lead) + len(data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.save()
+        return True
+
+
+class SectionWriter():
+    """
+    Stage new credentials file sections and swap them in atomically
+
+    Args:
+        :path (str): awscli credentials file; symlinks are followed
+        :batch_size (int): sections buffered in memory between flushes
+        :index (SectionIndex): when given, sections are written in padded
+            slots and the index is kept current
+        :in_place (bool): with an index, write staged sections into their
+            slots in place on commit, falling back to a full rewrite if a
+            section outgrew its slot
+        :drop (callable): existing sections whose name drop(name) is true
+            are removed on commit
+    """
+    def __init__(self, path, batch_size=BATCH_SIZE, index=None, in_place=False, drop=None):
+        self.path = os.path.realpath(path)
+        self.batch_size = batch_size
+        self.index = index
+        self.in_place = in_place
+        self.drop = drop
+        self.names = set()
+        self._batch = []
+        self._staged = []           # (name, offset in staging file, slot size, section size)
+        self._size = 0
+        self._staging = tempfile.TemporaryFile('w+b', dir=os.path.dirname(self.path))
+
+    def add(self, name, section):
+        """Stage section, replacing any existing section of the same name on commit"""
+        data = section.encode()
+        if self.index is not None:
+            body = data.strip(b'\n') + b'\n'
+            data = b'\n' + slot(body)
+            self._staged.append((name, self._size + 1, len(data) - 1, len(body)))
+        self.names.add(name)
+        self._batch.append(data)
+        self._size += len(data)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self._staging.write(b''.join(self._batch))
+        self._batch = []
+
+    def _read_staged(self):
+        """(name, section bytes) of the staged sections, without their slot padding"""
+        for name, offset, _, size in self._staged:
+            self._staging.seek(offset)
+            yield name, self._staging.read(size)
+
+    def _write_existing(self, out, sections):
+        """Copy blocks of the current file not replaced by a staged section; returns bytes written"""
+        held, position = b'', 0
+        try:
+            with open(self.path, 'rb') as f1:
+                for name, _, data in iter_raw_blocks(f1):
+                    if name in self.names or (name is not None and self.drop and self.drop(name)):
+                        continue
+                    body = data.rstrip(b'\n')
+                    out.write(held + body)
+                    position += len(held)
+                    if name is not None:
+                        sections[name] = [position, len(body) + 1]
+                    position += len(body)
+                    # blank lines after a block are written only if another block follows
+                    held = data[len(body):] or b'\n'
+        except FileNotFoundError:
+            return 0
+        if held:
+            out.write(b'\n')
+            position += 1
+        return position
+
+    def commit(self):
+        """Write the existing file minus replaced and dropped sections plus all staged sections, then rename"""
+        self.flush()
+        try:
+            if self.names or self.drop is not None:
+                with locked(self.path):
+                    self._commit()
+        finally:
+            self.close()
+
+    def _commit(self):
+        in_place = self.in_place and self.index is not None and self.drop is None
+        if self.names and in_place and self.index._update(list(self._read_staged())):
+            return
+        try:
+            mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        except FileNotFoundError:
+            mode = 0o600
+        sections = {}
+        tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                base = self._write_existing(out, sections)
+                self._staging.seek(0)
+                shutil.copyfileobj(self._staging, out)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        if self.index is not None:
+            sections.update((name, [base + offset, size]) for name, offset, size, _ in self._staged)
+            self.index.sections = sections
+            self.index.save()
+
+    def close(self):
+        self._staging.close()
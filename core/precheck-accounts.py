@@ -2,6 +2,8 @@
 Summary:
     - Script sanitizes accounts provided to gcreds as account lists.
     - Ensures all accounts are present in awscli config and do not have duplicates
+    - Account list lines may name the iam user assuming the role in a second
+      column; those users must be present in the awscli config as well
     - Automatically supresses output to standout to only return bool values if redirected
 
 """
@@ -56,7 +58,7 @@ def options(parser):
         TYPE: argparse object, parser argument set
     """
     parser.add_argument("-s", "--subset", nargs='?', type=str, required=True)
-    parser.add_argument("-S", "--superset", nargs='?', default=HOME + '/.aws/credentials.orig', type=str, required=False)
+    parser.add_argument("-S", "--superset", nargs='?', default=HOME + '/.gcreds/snapshots/latest', type=str, required=False)
     return parser.parse_args()
 
 
@@ -143,7 +145,7 @@ def subset_test(super, sub, silent=tty()):
 
 def init_cli():
 
-    subset, superset = [], []
+    subset, superset, principals = [], [], []
 
     try:
         parser = argparse.ArgumentParser()
@@ -160,7 +162,12 @@ def init_cli():
         with open(args.subset) as f1:
             f2 = f1.readlines()
             for name in f2:
-                subset.append(name[:-1])
+                fields = name.split()
+                # lines credential_engine.read_accounts skips: blank and comment lines
+                if not fields or name.startswith('#'):
+                    continue
+                subset.append(fields[0])
+                principals.extend(fields[1:2])
 
         with open(args.superset) as f1:
             f2 = f1.readlines()
@@ -172,7 +179,7 @@ def init_cli():
         return False
 
     # test subset within superset
-    if subset_test(superset, subset):
+    if subset_test(superset, subset + principals):
         # test subset to determine duplicates
         return duplicates(subset)
     return False
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Summary:
+    Profile index of the local awscli configuration.
+
+    The awscli config and credentials files are parsed in one pass into a
+    map of profile settings (role_arn, mfa_serial, source_profile, region,
+    duration_seconds, ...).  The index is cached on disk and rebuilt only
+    when the modification time or size of either file changes, so lookups
+    during a gcreds run are dictionary reads rather than 'aws configure get'
+    subprocesses.  Secret keys are never written to the index.
+
+Usage:
+    $ python3 profile_index.py --get <profile> <key>
+
+    Prints the value of key for profile; exit status 1 if not set.
+"""
+import argparse
+import json
+import os
+import sys
+from configparser import ConfigParser, Error as ConfigParserError
+
+
+HOME = os.environ['HOME']
+INDEX_VERSION = 1
+INDEXED_KEYS = (
+    'role_arn',
+    'mfa_serial',
+    'source_profile',
+    'region',
+    'duration_seconds',
+    'external_id',
+    'sts_region',
+    'sts_regional_endpoints'
+)
+
+
+def config_location():
+    return os.environ.get('AWS_CONFIG_FILE') or HOME + '/.aws/config'
+
+
+def credentials_location():
+    return os.environ.get('AWS_SHARED_CREDENTIALS_FILE') or HOME + '/.aws/credentials'
+
+
+def index_location():
+    return HOME + '/.gcreds/profile.index'
+
+
+def _sections(path, is_config):
+    """(profile name, section) pairs of an awscli config or credentials file"""
+    parser = ConfigParser(interpolation=None)
+    try:
+        parser.read(path)
+    except ConfigParserError:
+        return []
+    return [
+        (section[len('profile '):].strip() if is_config and section.startswith('profile ') else section.strip(),
+         parser[section])
+        for section in parser.sections()
+    ]
+
+
+def _fingerprint(paths):
+    stamps = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamps[path] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            stamps[path] = None
+    return stamps
+
+
+def build_index(config_file, credentials_file):
+    """
+    Summary:
+        Parse both awscli files into profile settings.  Values in the
+        config file take precedence, as with 'aws configure get'
+    Returns:
+        TYPE: dict, {profile name: {key: value}}
+    """
+    profiles = {}
+    for path, is_config in ((credentials_file, False), (config_file, True)):
+        for name, section in _sections(path, is_config):
+            entry = profiles.setdefault(name, {})
+            entry.update((k, section[k]) for k in INDEXED_KEYS if k in section)
+            if 'aws_access_key_id' in section:
+                entry['credentials'] = 'true'
+    return profiles
+
+
+def load_index(config_file=None, credentials_file=None, index_file=None):
+    """
+    Summary:
+        Profile settings from the cached index, rebuilt when either awscli
+        file has changed since the index was written
+    Returns:
+        TYPE: dict, {profile name: {key: value}}
+    """
+    config_file = config_file or config_location()
+    credentials_file = credentials_file or credentials_location()
+    index_file = index_file or index_location()
+    stamps = _fingerprint((config_file, credentials_file))
+
+    try:
+        with open(index_file) as f1:
+            cached = json.load(f1)
+        if cached.get('version') == INDEX_VERSION and cached.get('sources') == stamps:
+            return cached['profiles']
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    profiles = build_index(config_file, credentials_file)
+    tmp = '{}.{}.tmp'.format(index_file, os.getpid())
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f1:
+            json.dump({'version': INDEX_VERSION, 'sources': stamps, 'profiles': profiles}, f1)
+        os.replace(tmp, index_file)
+    except OSError:
+        pass
+    return profiles
+
+
+def read_keys(credentials_file=None):
+    """
+    Summary:
+        Access keys of every profile in the credentials file, including
+        gcreds session sections.  Read on demand; never cached
+    Returns:
+        TYPE: dict, {profile name: {AccessKeyId, SecretAccessKey, SessionToken}}
+    """
+    keys = {}
+    for name, section in _sections(credentials_file or credentials_location(), False):
+        if section.get('aws_access_key_id') and section.get('aws_secret_access_key'):
+            keys[name] = _keys(section)
+    return keys
+
+
+def section_keys(text):
+    """
+    Summary:
+        Access keys of a single credentials file section, as read through
+        the section offset index
+    Returns:
+        TYPE: dict, {AccessKeyId, SecretAccessKey, SessionToken}; None if absent
+    """
+    parser = ConfigParser(interpolation=None)
+    try:
+        parser.read_string(text)
+    except ConfigParserError:
+        return None
+    for name in parser.sections():
+        section = parser[name]
+        if section.get('aws_access_key_id') and section.get('aws_secret_access_key'):
+            return _keys(section)
+    return None
+
+
+def _keys(section):
+    return {
+        'AccessKeyId': section['aws_access_key_id'],
+        'SecretAccessKey': section['aws_secret_access_key'],
+        'SessionToken': section.get('aws_session_token') or section.get('aws_security_token')
+    }
+
+
+def options(parser):
+    """
+    Summary:
+        parse cli parameter options
+    Returns:
+        TYPE: argparse object, parser argument set
+    """
+    parser.add_argument("-g", "--get", nargs=2, metavar=('PROFILE', 'KEY'), type=str, required=True)
+    parser.add_argument("--credentials-file", default=credentials_location(), type=str, required=False)
+    parser.add_argument("--index-file", default=index_location(), type=str, required=False)
+    return parser.parse_args()
+
+
+def init_cli():
+    args = options(argparse.ArgumentParser())
+    profile, key = args.get
+    value = load_index(credentials_file=args.credentials_file, index_file=args.index_file).get(profile, {}).get(key)
+    if value is None:
+        return 1
+    print(value)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(init_cli())
@@ -0,0 +1,142 @@
+"""
+Summary:
+    Per-profile usage history for gcreds.
+
+    The serving paths record when consumers ask for the credentials of a
+    profile: the --credential-process fast path appends one line per
+    request to an access log next to the process cache (a shell builtin
+    append, no process spawned), 'provide' and 'serve' record the profiles
+    they answer.  Access logs are folded into ~/.gcreds/profile.usage:
+
+        {"<profile>": {"used": <epoch>, "hours": {"<hour>": [<days>, <day>], ...}}, ...}
+
+    'used' is the last access.  'hours' counts, per local hour of the
+    day, the distinct days the profile was used in that hour and the last
+    such day; a gap longer than HISTORY_DAYS starts the count again.
+
+    Refreshes driven by usage renew the profiles used recently (hot), let
+    the others lapse (cold), and pre-mint profiles used at the coming hour
+    of the day on at least PREFETCH_DAYS days.
+"""
+import json
+import os
+import time
+from credential_state import runtime_location
+
+
+HISTORY_DAYS = 14       # days without use after which the history of an hour starts again
+PREFETCH_DAYS = 3       # days a profile was used at an hour of the day before it is pre-minted for it
+HOUR = 3600
+
+
+def usage_location():
+    return os.environ['HOME'] + '/.gcreds/profile.usage'
+
+
+def access_location():
+    """Access log of the fast path, next to the process cache it answers from"""
+    return os.path.join(runtime_location(), 'access.log')
+
+
+def load_usage(path):
+    try:
+        with open(path) as f1:
+            usage = json.load(f1)
+        return usage if isinstance(usage, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_usage(path, usage):
+    """Write usage atomically, readable by the owner only"""
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f1:
+        json.dump(usage, f1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _day_hour(epoch):
+    """(local day number, local hour of the day) of epoch"""
+    local = time.localtime(epoch)
+    return int((epoch + local.tm_gmtoff) // 86400), local.tm_hour
+
+
+def touch(usage, profile, now=None):
+    """Record a request for the credentials of profile at now (epoch)"""
+    now = int(now or time.time())
+    entry = usage.setdefault(profile, {'used': 0, 'hours': {}})
+    entry['used'] = max(entry['used'], now)
+    day, hour = _day_hour(now)
+    days, last = entry['hours'].get(str(hour), (0, 0))
+    if day > last:
+        entry['hours'][str(hour)] = [days + 1 if day - last <= HISTORY_DAYS else 1, day]
+
+
+def fold_accesses(path, usage, keep=False):
+    """
+    Summary:
+        Move the lines of an access log ('<epoch> <profile>') into usage and
+        remove the log.  Only the last access of each profile per hour is
+        recorded; that is all the history keeps
+    Args:
+        :keep (bool): read the log into usage but leave it in place
+    Returns:
+        TYPE: int, number of access lines read
+    """
+    tmp = path if keep else '{}.{}'.format(path, os.getpid())
+    try:
+        if not keep:
+            # appends after the rename start a new log
+            os.rename(path, tmp)
+        f1 = open(tmp)
+    except FileNotFoundError:
+        return 0
+    latest, count = {}, 0
+    offset = time.localtime().tm_gmtoff
+    try:
+        with f1:
+            for line in f1:
+                fields = line.split()
+                if len(fields) != 2 or not fields[0].isdigit() or '/' in fields[1]:
+                    continue
+                count += 1
+                key = (fields[1], (int(fields[0]) + offset) // HOUR)
+                latest[key] = max(latest.get(key, 0), int(fields[0]))
+    finally:
+        if not keep:
+            os.remove(tmp)
+    for (profile, _), epoch in latest.items():
+        touch(usage, profile, epoch)
+    return count
+
+
+def recent(usage, profile, since):
+    """True if profile was used at or after since (epoch)"""
+    return usage.get(profile, {}).get('used', 0) >= since
+
+
+def _expected(entry, day, hour):
+    days, last = entry.get('hours', {}).get(str(hour), (0, 0))
+    return days >= PREFETCH_DAYS and day - last <= HISTORY_DAYS
+
+
+def predicted(usage, profile, at):
+    """True if history shows profile in use at the local hour of the day of at (epoch)"""
+    return _expected(usage.get(profile, {}), *_day_hour(at))
+
+
+def next_prefetch(usage, profiles, at):
+    """
+    Summary:
+        Start (epoch) of the first hour after the hour of at in which any of
+        profiles is predicted in use; None if none is within a day
+    """
+    entries = [usage[profile] for profile in profiles if profile in usage]
+    at = int(at)
+    start = at - (at + time.localtime(at).tm_gmtoff) % HOUR
+    for ahead in range(1, 25):
+        day, hour = _day_hour(start + ahead * HOUR)
+        if any(_expected(entry, day, hour) for entry in entries):
+            return start + ahead * HOUR
+    return None
@@ -0,0 +1,99 @@
+"""
+Summary:
+    Deadline scheduler behind the gcreds monitor.
+
+    Credential refresh, session end and display deadlines are kept in a
+    heap, and the scheduler sleeps until the earliest one instead of
+    polling.  Deadlines are given as wall clock times (STS expirations)
+    but sleeps are measured on the monotonic clock, so setting the clock
+    neither fires nor delays them.  A suspend or a clock jump shows as a
+    change in the offset between the two clocks; every deadline is then
+    rebuilt from its wall clock time, so refreshes missed while suspended
+    fire on resume.
+
+    Each refresh deadline is moved later by a jitter of up to half the
+    refresh window, fixed per profile and expiration, so profiles minted
+    together, and gcreds instances started together, do not all refresh
+    in the same second.
+
+    A prefetch deadline (no profile name) fires once: the refresh it starts
+    pre-mints for the coming hour, and the same hour is not prefetched
+    again should it still be listed.
+"""
+import heapq
+import itertools
+import random
+import time
+from credential_store import RETRY_INTERVAL
+
+
+DISPLAY_INTERVAL = 60       # seconds between display events; also the longest single sleep
+JITTER_MAX = 60             # seconds, upper bound of the refresh jitter
+CLOCK_SLACK = 2             # seconds of drift between wall and monotonic clocks taken as a clock jump
+
+
+class RefreshScheduler():
+    """
+    Args:
+        :deadlines (function): returns the current (epoch, event, name)
+            wall clock deadlines; name is None for a prefetch
+        :window (int): refresh window, seconds; refresh deadlines are
+            jittered by at most half of it, so they stay inside the window
+        :interval (int): seconds between display events
+    """
+    def __init__(self, deadlines, window, interval=DISPLAY_INTERVAL):
+        self.deadlines = deadlines
+        self.window = window
+        self.interval = interval
+        self.heap = []
+        self.offset = None
+        self.retry_after = 0        # monotonic time before which failed refreshes are not retried
+        self.prefetched = 0         # wall clock deadline of the last prefetch fired
+        self.sequence = itertools.count()      # orders deadlines due at the same time
+        self.rebuild()
+
+    @staticmethod
+    def _offset():
+        return time.time() - time.monotonic()
+
+    def jitter(self, name, epoch):
+        """Seconds a refresh deadline is delayed; the same for the same profile and expiration"""
+        return random.Random('{}:{}'.format(name, epoch)).uniform(0, min(JITTER_MAX, self.window / 2))
+
+    def rebuild(self):
+        """Reload the deadlines, converted to monotonic time"""
+        self.offset = self._offset()
+        heap = [(time.monotonic() + self.interval, next(self.sequence), 'display', None, None)]
+        for epoch, event, name in self.deadlines():
+            if event == 'refresh' and name is None and epoch <= self.prefetched:
+                continue
+            at = epoch - self.offset
+            if event == 'refresh':
+                at = max(at + self.jitter(name, epoch), self.retry_after)
+            heap.append((at, next(self.sequence), event, name, epoch))
+        heapq.heapify(heap)
+        self.heap = heap
+
+    def next(self):
+        """
+        Summary:
+            Sleep until the earliest deadline
+        Returns:
+            TYPE: tuple, (event, name) of the deadline reached
+        """
+        while True:
+            at, _, event, name, epoch = self.heap[0]
+            delay = at - time.monotonic()
+            if delay > 0:
+                time.sleep(min(delay, self.interval))
+                if abs(self._offset() - self.offset) > CLOCK_SLACK:
+                    # resumed from suspend or the clock was set
+                    self.rebuild()
+                continue
+            heapq.heappop(self.heap)
+            if event == 'refresh':
+                # a refresh run covers every profile in the window; those it fails are retried later
+                self.retry_after = time.monotonic() + RETRY_INTERVAL
+                if name is None:
+                    self.prefetched = max(self.prefetched, epoch)
+            return event, name
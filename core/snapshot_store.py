@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Summary:
+    Generational snapshots of the user-owned sections of the awscli
+    credentials file.
+
+    Each snapshot holds the credentials file minus the gcreds-* sections
+    gcreds manages.  Content is stored once per sha256 digest under
+    ~/.gcreds/snapshots/objects; every generation is a hard link to its
+    object, so a file changed back to earlier content adds a link rather
+    than a copy.  A run that finds the file as the latest snapshot left
+    it adds no generation.  The newest generations are kept, together
+    with a 'latest' link, and objects no generation refers to are removed.
+
+    Restoring replaces the user-owned sections of the credentials file
+    with those of a snapshot and leaves gcreds sections alone.
+
+Usage:
+    $ python3 snapshot_store.py --save
+    $ python3 snapshot_store.py --list
+    $ python3 snapshot_store.py --restore [GENERATION]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from credentials_file import SectionWriter, iter_raw_blocks
+from profile_index import credentials_location
+
+
+HOME = os.environ['HOME']
+PREFIX = 'gcreds-'
+KEEP_GENERATIONS = 10       # snapshot generations retained, newest first
+
+
+def store_location():
+    return HOME + '/.gcreds/snapshots'
+
+
+def user_owned(name):
+    """True for any section gcreds does not manage, including the preamble"""
+    return name is None or not name.startswith(PREFIX)
+
+
+def generations(store):
+    """Generation names, oldest first"""
+    try:
+        return sorted(name for name in os.listdir(store) if name[:1].isdigit())
+    except FileNotFoundError:
+        return []
+
+
+def save(path=None, store=None, keep=KEEP_GENERATIONS):
+    """
+    Summary:
+        Snapshot the user-owned sections of the credentials file
+    Args:
+        :path (str): awscli credentials file
+        :store (str): snapshot store directory
+        :keep (int): generations retained after the snapshot
+    Returns:
+        TYPE: str, generation name, the latest one when the file is
+        unchanged; None if the credentials file does not exist
+    """
+    path = path or credentials_location()
+    store = store or store_location()
+    objects = os.path.join(store, 'objects')
+    os.makedirs(objects, mode=0o700, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=objects)
+    try:
+        with os.fdopen(fd, 'wb') as out, open(path, 'rb') as f1:
+            for name, _, data in iter_raw_blocks(f1):
+                if user_owned(name):
+                    # blank lines between blocks vary with the sections around them; not content
+                    data = data.rstrip(b'\n') + b'\n\n'
+                    digest.update(data)
+                    out.write(data)
+        obj = os.path.join(objects, digest.hexdigest())
+        if os.path.exists(obj):
+            os.remove(tmp)
+        else:
+            os.replace(tmp, obj)
+    except FileNotFoundError:
+        os.remove(tmp)
+        return None
+
+    latest = os.path.join(store, 'latest')
+    if os.path.exists(latest) and os.path.samefile(latest, obj):
+        # unchanged since the last snapshot; no generation added, none pruned
+        for generation in reversed(generations(store)):
+            if os.path.samefile(os.path.join(store, generation), obj):
+                return generation
+
+    generation = '{}.{}'.format(time.strftime('%Y%m%dT%H%M%S'), digest.hexdigest()[:12])
+    if not os.path.exists(os.path.join(store, generation)):
+        os.link(obj, os.path.join(store, generation))
+    if os.path.lexists(latest + '.tmp'):
+        os.remove(latest + '.tmp')
+    os.link(obj, latest + '.tmp')
+    os.replace(latest + '.tmp', latest)
+    prune(store, keep)
+    return generation
+
+
+def prune(store, keep=KEEP_GENERATIONS):
+    """Remove all but the newest keep generations and any object left without a generation"""
+    for name in generations(store)[:-keep]:
+        os.remove(os.path.join(store, name))
+    objects = os.path.join(store, 'objects')
+    for name in os.listdir(objects):
+        obj = os.path.join(objects, name)
+        if os.stat(obj).st_nlink == 1:
+            os.remove(obj)
+
+
+def restore(generation='latest', path=None, store=None):
+    """
+    Summary:
+        Replace the user-owned sections of the credentials file with those
+        of a snapshot generation; gcreds sections are kept
+    Returns:
+        TYPE: int, number of sections restored
+    """
+    path = path or credentials_location()
+    store = store or store_location()
+    with open(os.path.join(store, generation), 'rb') as f1:
+        sections = [(name, data.decode()) for name, _, data in iter_raw_blocks(f1) if name is not None]
+    writer = SectionWriter(path, drop=user_owned)
+    try:
+        for name, text in sections:
+            writer.add(name, '\n' + text.strip('\n') + '\n')
+        writer.commit()
+    finally:
+        writer.close()
+    return len(sections)
+
+
+def options(parser):
+    """
+    Summary:
+        parse cli parameter options
+    Returns:
+        TYPE: argparse object, parser argument set
+    """
+    actions = parser.add_mutually_exclusive_group(required=True)
+    actions.add_argument("--save", action='store_true', default=False)
+    actions.add_argument("--list", action='store_true', default=False)
+    actions.add_argument("--restore", nargs='?', const='latest', default=None, type=str)
+    parser.add_argument("--credentials-file", default=credentials_location(), type=str, required=False)
+    parser.add_argument("--store", default=store_location(), type=str, required=False)
+    return parser.parse_args()
+
+
+def init_cli():
+    args = options(argparse.ArgumentParser())
+    try:
+        if args.save:
+            save(args.credentials_file, args.store)
+        elif args.list:
+            for name in generations(args.store):
+                print(name)
+        else:
+            print('{} sections restored from snapshot {}'.format(
+                restore(args.restore, args.credentials_file, args.store), args.restore)
+            )
+    except OSError as e:
+        sys.stderr.write('snapshot_store: {}\n'.format(e))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(init_cli())
@@ -0,0 +1,196 @@
+"""
+Summary:
+    Asyncio transport for the gcreds STS client.
+
+    Requests are signed by sts_client and sent over a small pool of
+    persistent (keep-alive) HTTP/1.1 connections.  Any number of coroutines
+    may have requests in flight; each waits for an idle pooled connection
+    instead of opening a new TLS session per request.
+
+Module Attributes:
+    - MAX_CONNECTIONS (int): upper bound on pooled connections per endpoint
+"""
+import asyncio
+import ssl
+import urllib.parse
+from sts_client import (
+    STSError, DEFAULT_ENDPOINT, DEFAULT_REGION, TIMEOUT,
+    build_query, sign_request, parse_credentials, parse_error
+)
+
+
+MAX_CONNECTIONS = 32
+
+
+class _Connection():
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool():
+    """
+    Pool of persistent connections to a single endpoint
+
+    Args:
+        :endpoint (str): endpoint url, https:// or http://
+        :size (int): maximum number of open connections
+    """
+    def __init__(self, endpoint, size=MAX_CONNECTIONS):
+        url = urllib.parse.urlsplit(endpoint)
+        self.host = url.hostname
+        self.netloc = url.netloc
+        self.tls = url.scheme != 'http'
+        self.port = url.port or (443 if self.tls else 80)
+        self.size = max(1, size)
+        self._idle = []
+        self._open = 0
+        self._available = asyncio.Condition()
+        self._ssl = ssl.create_default_context() if self.tls else None
+
+    async def acquire(self):
+        async with self._available:
+            while not self._idle and self._open >= self.size:
+                await self._available.wait()
+            if self._idle:
+                conn = self._idle.pop()
+                conn.reused = True
+                return conn
+            self._open += 1
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host, self.port, ssl=self._ssl,
+                    server_hostname=self.host if self.tls else None
+                ),
+                TIMEOUT
+            )
+        except BaseException:
+            await self._discard()
+            raise
+        return _Connection(reader, writer)
+
+    async def release(self, conn, reusable=True):
+        if not reusable:
+            conn.close()
+            await self._discard()
+            return
+        async with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    async def _discard(self):
+        async with self._available:
+            self._open -= 1
+            self._available.notify()
+
+    def close(self):
+        for conn in self._idle:
+            conn.close()
+        self._open -= len(self._idle)
+        self._idle = []
+
+
+async def _read_response(reader):
+    """Minimal HTTP/1.1 response parser; returns (status, headers, body)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('connection closed by peer')
+    fields = status_line.split()
+    if len(fields) < 2 or not fields[1].isdigit():
+        raise ValueError('malformed status line {!r}'.format(status_line[:80]))
+    status = int(fields[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, body.decode('utf-8')
+
+
+class AsyncSTSClient():
+    """
+    Asyncio STS client sharing one connection pool across all requests
+
+    Args:
+        :credentials (dict): AccessKeyId, SecretAccessKey, SessionToken (optional)
+        :endpoint (str): STS endpoint url (default: global endpoint)
+        :region (str): signing region
+        :pool_size (int): maximum number of persistent connections
+    """
+    def __init__(self, credentials, endpoint=DEFAULT_ENDPOINT, region=DEFAULT_REGION,
+                 pool_size=MAX_CONNECTIONS):
+        self.credentials = credentials
+        self.region = region
+        self.pool = ConnectionPool(endpoint, min(pool_size, MAX_CONNECTIONS))
+
+    def close(self):
+        self.pool.close()
+
+    async def _send(self, conn, body, headers):
+        request = 'POST / HTTP/1.1\r\n' + ''.join(
+            '{}: {}\r\n'.format(k, v) for k, v in headers.items()
+        ) + 'content-length: {}\r\nconnection: keep-alive\r\n\r\n'.format(len(body))
+        conn.writer.write(request.encode('latin-1') + body.encode('utf-8'))
+        await conn.writer.drain()
+        return await asyncio.wait_for(_read_response(conn.reader), TIMEOUT)
+
+    async def call(self, action, params, credentials=None):
+        """
+        Summary:
+            Sign and send one STS Query API request
+        Args:
+            :credentials (dict): signing credentials for this request only,
+                ie the credentials of a source role when chaining roles
+        Returns:
+            TYPE: dict, Credentials element of the response
+        Raises:
+            STSError
+        """
+        body = build_query(action, params)
+        headers = sign_request(credentials or self.credentials, self.pool.netloc, self.region, body)
+        for attempt in (1, 2):
+            try:
+                conn = await self.pool.acquire()
+            except (OSError, asyncio.TimeoutError) as e:
+                raise STSError('ConnectionError', str(e) or 'connect timeout')
+            try:
+                status, response_headers, payload = await self._send(conn, body, headers)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                await self.pool.release(conn, reusable=False)
+                # an idle keep-alive connection may have been closed by the server; retry once
+                if conn.reused and attempt == 1:
+                    continue
+                raise STSError('ConnectionError', str(e) or 'read timeout')
+            await self.pool.release(
+                conn, reusable=response_headers.get('connection', '').lower() != 'close'
+            )
+            if status != 200:
+                raise parse_error(payload, status)
+            return parse_credentials(payload)
+
+    async def assume_role(self, role_arn, session_name, duration, external_id=None, credentials=None):
+        return await self.call('AssumeRole', {
+            'RoleArn': role_arn,
+            'RoleSessionName': session_name,
+            'DurationSeconds': duration,
+            'ExternalId': external_id
+        }, credentials)
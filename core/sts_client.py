@@ -0,0 +1,240 @@
+"""
+Summary:
+    Amazon Security Token Service (STS) client used by gcreds.
+
+    Requests (AssumeRole, GetSessionToken) are signed with AWS Signature
+    Version 4 and sent directly to the STS Query API.  Responses are parsed
+    in memory; no awscli or jq subprocess is required.
+
+Module Attributes:
+    - STS_API_VERSION (str): STS Query API version
+    - DEFAULT_ENDPOINT (str): global STS endpoint used by awscli by default
+    - DEFAULT_REGION (str): signing region of the global STS endpoint
+"""
+import datetime
+import functools
+import hashlib
+import hmac
+import http.client
+import urllib.parse
+import xml.etree.ElementTree as ET
+
+
+STS_API_VERSION = '2011-06-15'
+STS_SERVICE = 'sts'
+DEFAULT_ENDPOINT = 'https://sts.amazonaws.com'
+DEFAULT_REGION = 'us-east-1'
+CONTENT_TYPE = 'application/x-www-form-urlencoded; charset=utf-8'
+TIMEOUT = 30                # seconds, socket timeout per request
+
+
+class STSError(Exception):
+    """
+    Error returned by the STS service (or the transport used to reach it)
+
+    Attributes:
+        code (str):  STS error code (ExpiredToken, AccessDenied, Throttling...)
+        message (str):  error message returned by STS
+        status (int):  http status code, None if the request was never sent
+    """
+    def __init__(self, code, message, status=None):
+        super().__init__('{}: {}'.format(code, message))
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+# --- signature version 4  ------------------------------------------------------------------------
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+
+
+@functools.lru_cache(maxsize=64)
+def signing_key(secret_key, datestamp, region, service=STS_SERVICE):
+    """
+    Summary:
+        Derive the SigV4 signing key for a date, region and service.  Keys
+        are cached; the derivation runs once per credential, day and region
+        rather than once per request
+    Returns:
+        TYPE: bytes
+    """
+    k_date = _hmac(('AWS4' + secret_key).encode('utf-8'), datestamp)
+    k_region = _hmac(k_date, region)
+    k_service = _hmac(k_region, service)
+    return _hmac(k_service, 'aws4_request')
+
+
+def sign_request(credentials, host, region, body, now=None):
+    """
+    Summary:
+        Compute SigV4 headers for an STS Query API POST request
+    Args:
+        :credentials (dict): AccessKeyId, SecretAccessKey, SessionToken (optional)
+        :host (str): endpoint hostname, ie sts.amazonaws.com
+        :region (str): signing region
+        :body (str): url-encoded request body
+        :now (datetime): request time, utc (default: current time)
+    Returns:
+        TYPE: dict, http headers to send with the request
+    """
+    now = now or datetime.datetime.utcnow()
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    datestamp = now.strftime('%Y%m%d')
+
+    headers = {
+        'content-type': CONTENT_TYPE,
+        'host': host,
+        'x-amz-date': amz_date
+    }
+    if credentials.get('SessionToken'):
+        headers['x-amz-security-token'] = credentials['SessionToken']
+
+    signed_headers = ';'.join(sorted(headers))
+    canonical_headers = ''.join('{}:{}\n'.format(k, headers[k]) for k in sorted(headers))
+    payload_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    canonical_request = '\n'.join(
+        ['POST', '/', '', canonical_headers, signed_headers, payload_hash]
+    )
+    scope = '{}/{}/{}/aws4_request'.format(datestamp, region, STS_SERVICE)
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256',
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    ])
+    key = signing_key(credentials['SecretAccessKey'], datestamp, region)
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    headers['authorization'] = (
+        'AWS4-HMAC-SHA256 Credential={}/{}, SignedHeaders={}, Signature={}'.format(
+            credentials['AccessKeyId'], scope, signed_headers, signature
+        )
+    )
+    return headers
+
+
+# --- request / response  -------------------------------------------------------------------------
+
+
+def build_query(action, params):
+    """Url-encoded STS Query API request body"""
+    query = {'Action': action, 'Version': STS_API_VERSION}
+    query.update({k: str(v) for k, v in params.items() if v is not None})
+    return urllib.parse.urlencode(sorted(query.items()), quote_via=urllib.parse.quote)
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(element, name):
+    for child in element.iter():
+        if _localname(child.tag) == name:
+            return child
+    return None
+
+
+def parse_credentials(body):
+    """
+    Summary:
+        Extract the Credentials element of an STS response
+    Returns:
+        TYPE: dict, AccessKeyId, SecretAccessKey, SessionToken, Expiration
+    """
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError as e:
+        raise STSError('MalformedResponse', str(e))
+    element = _find(root, 'Credentials')
+    if element is None:
+        raise STSError('MalformedResponse', 'no Credentials element in STS response')
+    return {_localname(child.tag): (child.text or '').strip() for child in element}
+
+
+def parse_error(body, status):
+    """Convert an STS ErrorResponse document into an STSError"""
+    try:
+        root = ET.fromstring(body)
+        code = _find(root, 'Code')
+        message = _find(root, 'Message')
+        return STSError(
+            code.text if code is not None else 'HTTP{}'.format(status),
+            message.text if message is not None else '',
+            status
+        )
+    except ET.ParseError:
+        return STSError('HTTP{}'.format(status), body[:200], status)
+
+
+# --- client  -------------------------------------------------------------------------------------
+
+
+class STSClient():
+    """
+    Synchronous STS client.  A single keep-alive connection is reused for
+    every request issued by the same client instance.
+
+    Args:
+        :credentials (dict): AccessKeyId, SecretAccessKey, SessionToken (optional)
+        :endpoint (str): STS endpoint url (default: global endpoint)
+        :region (str): signing region
+    """
+    def __init__(self, credentials, endpoint=DEFAULT_ENDPOINT, region=DEFAULT_REGION):
+        self.credentials = credentials
+        self.endpoint = urllib.parse.urlsplit(endpoint)
+        self.region = region
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            if self.endpoint.scheme == 'http':
+                self._conn = http.client.HTTPConnection(self.endpoint.netloc, timeout=TIMEOUT)
+            else:
+                self._conn = http.client.HTTPSConnection(self.endpoint.netloc, timeout=TIMEOUT)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def call(self, action, params):
+        """
+        Summary:
+            Sign and send one STS Query API request
+        Returns:
+            TYPE: dict, Credentials element of the response
+        Raises:
+            STSError
+        """
+        body = build_query(action, params)
+        headers = sign_request(self.credentials, self.endpoint.netloc, self.region, body)
+        try:
+            conn = self._connection()
+            conn.request('POST', '/', body=body.encode('utf-8'), headers=headers)
+            response = conn.getresponse()
+            payload = response.read().decode('utf-8')
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise STSError('ConnectionError', str(e))
+        if response.status != 200:
+            raise parse_error(payload, response.status)
+        return parse_credentials(payload)
+
+    def assume_role(self, role_arn, session_name, duration, external_id=None):
+        return self.call('AssumeRole', {
+            'RoleArn': role_arn,
+            'RoleSessionName': session_name,
+            'DurationSeconds': duration,
+            'ExternalId': external_id
+        })
+
+    def get_session_token(self, duration, serial_number=None, token_code=None):
+        return self.call('GetSessionToken', {
+            'DurationSeconds': duration,
+            'SerialNumber': serial_number,
+            'TokenCode': token_code
+        })
@@ -0,0 +1,166 @@
+"""
+Summary:
+    Amazon STS endpoint resolution for gcreds.
+
+    Maps a region to its partition (aws, aws-cn, aws-us-gov) and regional
+    STS endpoint, resolves the endpoint configured for a profile, and
+    selects the lowest-latency regional endpoint by probing connection
+    times.  Probe results are cached between runs.
+
+Module Attributes:
+    - PARTITIONS (dict): partition name => (dns suffix, default region)
+    - PROBE_REGIONS (tuple): regions probed when selecting an endpoint
+"""
+import asyncio
+import json
+import os
+import ssl
+import time
+from sts_client import DEFAULT_ENDPOINT, DEFAULT_REGION
+
+
+PARTITIONS = {
+    'aws': ('amazonaws.com', DEFAULT_REGION),
+    'aws-cn': ('amazonaws.com.cn', 'cn-north-1'),
+    'aws-us-gov': ('amazonaws.com', 'us-gov-west-1')
+}
+PROBE_REGIONS = (
+    'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'ca-central-1',
+    'eu-west-1', 'eu-west-2', 'eu-central-1', 'eu-north-1',
+    'ap-southeast-1', 'ap-southeast-2', 'ap-northeast-1', 'ap-south-1', 'sa-east-1'
+)
+PROBE_TIMEOUT = 3           # seconds, per endpoint
+PROBE_MAX_AGE = 86400       # seconds, lifetime of a cached probe result
+GLOBAL = 'global'
+AUTO = 'auto'
+
+
+def partition_of(region=None, arn=None):
+    """Partition name of a region or, when no region is given, of an arn"""
+    if region:
+        if region.startswith('cn-'):
+            return 'aws-cn'
+        if region.startswith('us-gov-'):
+            return 'aws-us-gov'
+        return 'aws'
+    if arn and arn.startswith('arn:'):
+        partition = arn.split(':')[1]
+        if partition in PARTITIONS:
+            return partition
+    return 'aws'
+
+
+def endpoint(region=None, partition='aws'):
+    """
+    Summary:
+        STS endpoint url and signing region
+    Args:
+        :region (str): region name; None or 'global' selects the global
+            endpoint (aws partition) or the partition's default region
+        :partition (str): partition used when region is not given
+    Returns:
+        TYPE: tuple, (url, signing region)
+    """
+    if region in (None, '', GLOBAL):
+        if partition == 'aws':
+            return DEFAULT_ENDPOINT, DEFAULT_REGION
+        region = PARTITIONS[partition][1]
+    suffix = PARTITIONS[partition_of(region)][0]
+    return 'https://sts.{}.{}'.format(region, suffix), region
+
+
+def profile_partition(settings):
+    """
+    Summary:
+        Partition of a profile: that of its role arn, else of its mfa serial
+        (iam user profiles have no role arn), else of its region
+    Returns:
+        TYPE: str, None when the profile names none of them
+    """
+    for arn in (settings.get('role_arn'), settings.get('mfa_serial')):
+        if arn and arn.startswith('arn:'):
+            return partition_of(arn=arn)
+    region = settings.get('sts_region') or settings.get('region')
+    return partition_of(region) if region else None
+
+
+def profile_region(settings):
+    """
+    Summary:
+        Region of the STS endpoint configured for a profile: 'sts_region', or
+        'region' when regional endpoints are enabled for the profile or via
+        AWS_STS_REGIONAL_ENDPOINTS
+    Returns:
+        TYPE: str, None for the global endpoint
+    """
+    if settings.get('sts_region'):
+        return settings['sts_region']
+    mode = settings.get('sts_regional_endpoints') or os.environ.get('AWS_STS_REGIONAL_ENDPOINTS')
+    if mode == 'regional':
+        return settings.get('region')
+    return None
+
+
+# --- latency probe  ------------------------------------------------------------------------------
+
+
+async def _connect_time(region, context):
+    url, _ = endpoint(region)
+    host = url.split('//', 1)[1]
+    start = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, 443, ssl=context, server_hostname=host), PROBE_TIMEOUT
+        )
+    except (OSError, asyncio.TimeoutError):
+        return region, None
+    elapsed = time.monotonic() - start
+    writer.close()
+    return region, elapsed
+
+
+def probe(regions=PROBE_REGIONS):
+    """
+    Summary:
+        Measure TCP + TLS connection time to each regional STS endpoint
+    Returns:
+        TYPE: list, (region, seconds) tuples of reachable endpoints, fastest first
+    """
+    async def run():
+        context = ssl.create_default_context()
+        return await asyncio.gather(*(_connect_time(region, context) for region in regions))
+
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(run())
+    finally:
+        loop.close()
+    return sorted((r for r in results if r[1] is not None), key=lambda r: r[1])
+
+
+def select_region(cache_file, max_age=PROBE_MAX_AGE):
+    """
+    Summary:
+        Lowest-latency STS region, from cache_file when the cached probe is
+        younger than max_age, otherwise probed and written to cache_file
+    Returns:
+        TYPE: str, region name, None if no endpoint was reachable
+    """
+    try:
+        with open(cache_file) as f1:
+            cached = json.load(f1)
+        if time.time() - cached['probed'] < max_age:
+            return cached['region']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    results = probe()
+    if not results:
+        return None
+    region, latency = results[0]
+    try:
+        with open(cache_file, 'w') as f1:
+            json.dump({'region': region, 'latency_ms': round(latency * 1000, 1), 'probed': int(time.time())}, f1)
+    except OSError:
+        pass
+    return region
@@ -0,0 +1,115 @@
+"""
+Summary:
+    Adaptive (AIMD) concurrency control and retry policy for STS requests.
+
+    The number of requests allowed in flight grows by one for every window
+    of successful calls (additive increase) and is halved when STS answers
+    with a throttling error (multiplicative decrease).  A throttle reported
+    by a request sent before the most recent decrease is ignored so that one
+    burst of errors cuts the window only once.
+
+    Failed calls with a transient cause are retried after a jittered
+    exponential backoff ("full jitter": a uniform delay between zero and
+    the exponential ceiling) so retries from many profiles do not align.
+
+Module Attributes:
+    - THROTTLE_CODES (tuple): STS error codes treated as throttling
+    - TRANSIENT_CODES (tuple): STS error codes worth retrying
+"""
+import asyncio
+import collections
+import random
+import time
+
+
+THROTTLE_CODES = (
+    'Throttling',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException'
+)
+TRANSIENT_CODES = THROTTLE_CODES + (
+    'ConnectionError',
+    'InternalFailure',
+    'ServiceUnavailable',
+    'IDPCommunicationError',
+    'MalformedResponse'
+)
+RATE_WINDOW = 200           # completed calls used to compute the sustained rate
+MAX_ATTEMPTS = 6            # attempts per request before it is reported failed
+BACKOFF_BASE = 0.2          # seconds, backoff ceiling of the first retry
+BACKOFF_CAP = 20            # seconds, maximum backoff ceiling
+
+
+def is_throttle(error):
+    """True if the STSError is a throttling response"""
+    return getattr(error, 'code', None) in THROTTLE_CODES
+
+
+def is_retryable(error):
+    """True if the STSError is transient: throttling, network or 5xx server errors"""
+    status = getattr(error, 'status', None) or 0
+    return getattr(error, 'code', None) in TRANSIENT_CODES or status >= 500
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full jitter delay (seconds) before retry number attempt (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AdaptiveLimiter():
+    """
+    AIMD limiter bounding the number of concurrent requests
+
+    Args:
+        :maximum (int): upper bound on requests in flight (--concurrency)
+        :initial (int): starting window, default is the lesser of 4 and maximum
+        :minimum (int): lower bound on requests in flight
+        :decrease (float): factor applied to the window when throttled
+    """
+    def __init__(self, maximum, initial=None, minimum=1, decrease=0.5):
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.decrease = decrease
+        self.limit = float(min(self.maximum, initial or 4))
+        self.in_flight = 0
+        self.throttled = 0
+        self._epoch = 0
+        self._started = None
+        self._total = 0
+        self._completed = collections.deque(maxlen=RATE_WINDOW)
+        self._available = asyncio.Condition()
+
+    async def acquire(self):
+        """Wait for a free slot; returns a token to pass to release()"""
+        async with self._available:
+            while self.in_flight >= int(self.limit):
+                await self._available.wait()
+            self.in_flight += 1
+            if self._started is None:
+                self._started = time.monotonic()
+            return self._epoch
+
+    async def release(self, token, throttled=False):
+        async with self._available:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                if token == self._epoch:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._epoch += 1
+            else:
+                self._total += 1
+                self._completed.append(time.monotonic())
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._available.notify_all()
+
+    def rate(self):
+        """Sustained successful calls per second over the most recent window"""
+        if not self._completed:
+            return 0.0
+        if self._total <= RATE_WINDOW:
+            count, elapsed = self._total, self._completed[-1] - self._started
+        else:
+            count, elapsed = len(self._completed) - 1, self._completed[-1] - self._completed[0]
+        return count / elapsed if elapsed > 0 else 0.0
@@ -67,6 +67,19 @@ install -m 0644 colors.sh $RPM_BUILD_ROOT/%{_libdir}/colors.sh
 install -m 0644 colors.py $RPM_BUILD_ROOT/%{_libdir}/colors.py
 install -m 0644 iam_users.py $RPM_BUILD_ROOT/%{_libdir}/iam_users.py
 install -m 0644 precheck-accounts.py $RPM_BUILD_ROOT/%{_libdir}/precheck-accounts.py
+install -m 0644 profile_index.py $RPM_BUILD_ROOT/%{_libdir}/profile_index.py
+install -m 0644 profile_usage.py $RPM_BUILD_ROOT/%{_libdir}/profile_usage.py
+install -m 0644 refresh_scheduler.py $RPM_BUILD_ROOT/%{_libdir}/refresh_scheduler.py
+install -m 0644 sts_client.py $RPM_BUILD_ROOT/%{_libdir}/sts_client.py
+install -m 0644 sts_async.py $RPM_BUILD_ROOT/%{_libdir}/sts_async.py
+install -m 0644 sts_endpoints.py $RPM_BUILD_ROOT/%{_libdir}/sts_endpoints.py
+install -m 0644 throttle.py $RPM_BUILD_ROOT/%{_libdir}/throttle.py
+install -m 0644 credential_state.py $RPM_BUILD_ROOT/%{_libdir}/credential_state.py
+install -m 0644 credential_store.py $RPM_BUILD_ROOT/%{_libdir}/credential_store.py
+install -m 0644 credential_server.py $RPM_BUILD_ROOT/%{_libdir}/credential_server.py
+install -m 0644 credentials_file.py $RPM_BUILD_ROOT/%{_libdir}/credentials_file.py
+install -m 0644 snapshot_store.py $RPM_BUILD_ROOT/%{_libdir}/snapshot_store.py
+install -m 0644 credential_engine.py $RPM_BUILD_ROOT/%{_libdir}/credential_engine.py
 install -m 0644 version.py $RPM_BUILD_ROOT/%{_libdir}/version.py
 install -m 0644 gcreds-completion.bash $RPM_BUILD_ROOT/%{_compdir}/gcreds-completion.bash
 
@@ -0,0 +1,8 @@
+"""
+Summary:
+    pytest configuration; the gcreds python helpers are flat modules in core/
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
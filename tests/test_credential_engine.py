@@ -0,0 +1,180 @@
+"""
+Summary:
+    Tests for core/credential_engine.py
+"""
+import argparse
+import asyncio
+import pytest
+import credential_engine as e
+from sts_client import STSError
+
+
+class FakeSTS():
+    """AsyncSTSClient stand-in recording each AssumeRole call; role arns containing 'denied' fail"""
+    calls = []
+
+    def __init__(self, credentials, endpoint, region, pool_size):
+        self.endpoint = endpoint
+
+    async def assume_role(self, role_arn, session_name, duration, external_id=None, credentials=None):
+        FakeSTS.calls.append((role_arn, duration, (credentials or {}).get('AccessKeyId')))
+        await asyncio.sleep(0)
+        if 'denied' in role_arn:
+            raise STSError('AccessDenied', 'not authorized', 403)
+        return {'AccessKeyId': 'ASIA-' + role_arn.rsplit('/', 1)[1], 'SecretAccessKey': 's', 'SessionToken': 't'}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sts(monkeypatch):
+    FakeSTS.calls = []
+    monkeypatch.setattr(e, 'AsyncSTSClient', FakeSTS)
+    return FakeSTS.calls
+
+
+def mint(profiles, accounts, concurrency=8):
+    results = []
+    sessions = {'user': {'AccessKeyId': 'SESSION'}}
+    _, calls = e.mint_roles(
+        sessions, accounts, profiles, 3600,
+        lambda profile: ('https://sts.amazonaws.com', 'us-east-1'),
+        lambda entry, outcome: results.append((entry[0], outcome)),
+        concurrency
+    )
+    return results, calls
+
+
+def test_mint_roles_duplicate_role_assumed_once(sts):
+    profiles = {
+        'a': {'role_arn': 'arn:aws:iam::1:role/admin'},
+        'b': {'role_arn': 'arn:aws:iam::1:role/admin'},
+        'c': {'role_arn': 'arn:aws:iam::2:role/admin'},
+        'd': {'role_arn': 'arn:aws:iam::1:role/admin', 'duration_seconds': '900'}
+    }
+    results, calls = mint(profiles, [(name, 'user') for name in 'abcd'])
+    assert [profile for profile, _ in results] == ['a', 'b', 'c', 'd']
+    assert results[0][1] is results[1][1]
+    assert calls == len(sts) == 3
+    assert sorted(sts) == [
+        ('arn:aws:iam::1:role/admin', 900, 'SESSION'),
+        ('arn:aws:iam::1:role/admin', 3600, 'SESSION'),
+        ('arn:aws:iam::2:role/admin', 3600, 'SESSION')
+    ]
+
+
+def test_mint_roles_duplicate_failure_shared(sts):
+    profiles = {name: {'role_arn': 'arn:aws:iam::1:role/denied'} for name in 'ab'}
+    results, calls = mint(profiles, [('a', 'user'), ('b', 'user'), ('missing', 'user')])
+    assert calls == len(sts) == 1
+    assert [outcome.code for _, outcome in results] == ['AccessDenied', 'AccessDenied', 'ProfileNotFound']
+
+
+def resolver_args(**kwargs):
+    args = {'endpoint_url': None, 'region': None, 'sts_region': None, 'probe_cache': None}
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def test_endpoint_resolver_partition(monkeypatch):
+    monkeypatch.delenv('AWS_STS_REGIONAL_ENDPOINTS', raising=False)
+    profiles = {
+        'gov': {'role_arn': 'arn:aws-us-gov:iam::1:role/r'},
+        'cn': {'role_arn': 'arn:aws-cn:iam::1:role/r', 'sts_region': 'cn-northwest-1'},
+        'eu': {'role_arn': 'arn:aws:iam::1:role/r', 'sts_region': 'eu-west-1'}
+    }
+    locate = e.endpoint_resolver(resolver_args(), profiles)
+    assert locate('gov') == ('https://sts.us-gov-west-1.amazonaws.com', 'us-gov-west-1')
+    assert locate('cn') == ('https://sts.cn-northwest-1.amazonaws.com.cn', 'cn-northwest-1')
+    assert locate('eu') == ('https://sts.eu-west-1.amazonaws.com', 'eu-west-1')
+
+    # --sts-region applies only to profiles of its own partition
+    locate = e.endpoint_resolver(resolver_args(sts_region='us-west-2'), profiles)
+    assert locate('eu') == ('https://sts.us-west-2.amazonaws.com', 'us-west-2')
+    assert locate('gov') == ('https://sts.us-gov-west-1.amazonaws.com', 'us-gov-west-1')
+
+    locate = e.endpoint_resolver(resolver_args(endpoint_url='http://127.0.0.1:9000', region='eu-west-1'), profiles)
+    assert locate('gov') == ('http://127.0.0.1:9000', 'eu-west-1')
+
+
+def test_role_chain():
+    profiles = {
+        'spoke': {'role_arn': 'arn:aws:iam::2:role/spoke', 'source_profile': 'hub'},
+        'hub': {'role_arn': 'arn:aws:iam::1:role/hub', 'source_profile': 'user'},
+        'user': {'mfa_serial': 'arn:aws:iam::1:mfa/user'},
+        'x': {'role_arn': 'arn:aws:iam::1:role/x', 'source_profile': 'y'},
+        'y': {'role_arn': 'arn:aws:iam::1:role/y', 'source_profile': 'x'}
+    }
+    assert e.role_chain(profiles, 'spoke') == ['spoke', 'hub']
+    assert e.role_chain(profiles, 'hub') == ['hub']
+    with pytest.raises(STSError) as error:
+        e.role_chain(profiles, 'x')
+    assert error.value.code == 'InvalidConfiguration'
+
+
+def test_mint_roles_hub_assumed_once(sts):
+    profiles = {'hub': {'role_arn': 'arn:aws:iam::1:role/hub', 'duration_seconds': '43200'}}
+    spokes = ['spoke{}'.format(i) for i in range(20)]
+    for name in spokes:
+        profiles[name] = {'role_arn': 'arn:aws:iam::2:role/' + name, 'source_profile': 'hub'}
+    results, calls = mint(profiles, [('hub', 'user')] + [(name, 'user') for name in spokes], concurrency=4)
+
+    # one request for the hub, whether listed itself or as a source, plus one per spoke
+    assert calls == len(sts) == 21
+    assert [call for call in sts if call[0].endswith('/hub')] == [('arn:aws:iam::1:role/hub', 43200, 'SESSION')]
+    assert all(call[1:] == (3600, 'ASIA-hub') for call in sts if '/spoke' in call[0])
+    assert [profile for profile, _ in results] == ['hub'] + spokes
+
+
+def test_mint_roles_hub_failure(sts):
+    profiles = {'hub': {'role_arn': 'arn:aws:iam::1:role/denied'}}
+    profiles.update((name, {'role_arn': 'arn:aws:iam::2:role/' + name, 'source_profile': 'hub'}) for name in 'ab')
+    results, _ = mint(profiles, [('a', 'user'), ('b', 'user')])
+    assert len(sts) == 1
+    assert [outcome.code for _, outcome in results] == ['SourceProfileFailed'] * 2
+
+
+def test_install_pads_only_the_gcreds_file(tmp_path):
+    section = tmp_path / 'new'
+    section.write_text('[gcreds-a]\naws_access_key_id = ASIA\naws_secret_access_key = s\n')
+    awscli = tmp_path / 'credentials'
+    awscli.write_text('[default]\naws_access_key_id = AKID\naws_secret_access_key = s\n')
+    args = argparse.Namespace(
+        credentials_file=str(awscli), output_file=None,
+        sections_index=str(tmp_path / 'sections.index'), files=[str(section)]
+    )
+    assert e.cmd_install(args) == 0
+    assert awscli.read_text() == (
+        '[default]\naws_access_key_id = AKID\naws_secret_access_key = s\n'
+        '\n[gcreds-a]\naws_access_key_id = ASIA\naws_secret_access_key = s\n'
+    )
+
+    args.output_file = str(tmp_path / 'gcreds.credentials')
+    assert e.cmd_install(args) == 0
+    with open(args.output_file) as f1:
+        text = f1.read()
+    assert text.startswith('\n[gcreds-a]\n') and '#' in text
+    assert len(text) % 512 == 1
+
+
+def test_clean_drops_sections_and_stanzas(tmp_path):
+    credentials = tmp_path / 'credentials'
+    credentials.write_text('[default]\nregion = us-east-1\n\n[gcreds-a]\naws_access_key_id = ASIA\n')
+    config = tmp_path / 'config'
+    config.write_text(
+        '[default]\nregion = us-east-1\n\n[profile gcreds-a]\ncredential_process = gcreds --credential-process a\n'
+        '\n[profile a]\nrole_arn = arn:aws:iam::1:role/a\n'
+    )
+    args = argparse.Namespace(
+        credentials_file=str(credentials), output_file=None,
+        sections_index=str(tmp_path / 'sections.index'), process_config=str(config)
+    )
+    assert e.cmd_clean(args) == 0
+    assert credentials.read_text() == '[default]\nregion = us-east-1\n'
+    assert config.read_text() == '[default]\nregion = us-east-1\n\n[profile a]\nrole_arn = arn:aws:iam::1:role/a\n'
+
+    # a missing credentials file is not created
+    args.output_file = str(tmp_path / 'missing' / 'credentials')
+    assert e.cmd_clean(args) == 0
+    assert not (tmp_path / 'missing').exists()
@@ -0,0 +1,50 @@
+"""
+Summary:
+    Tests for core/credential_server.py
+"""
+import json
+import socket
+import threading
+import pytest
+from credential_server import CredentialBroker, broker_fetch
+
+
+class FakeStore():
+    def get_many(self, profiles):
+        found = dict((p, ({'AccessKeyId': 'AKIA', 'SecretAccessKey': 's', 'SessionToken': 't'}, None)) for p in profiles)
+        return found, {}
+
+
+@pytest.fixture
+def broker(tmp_path):
+    path = str(tmp_path / 'run' / 'broker.sock')
+    server = CredentialBroker(path, FakeStore())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def ask(path, lines):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(path)
+    try:
+        conn.sendall(b''.join(line + b'\n' for line in lines))
+        with conn.makefile('rb') as f1:
+            return [json.loads(f1.readline().decode()) for _ in lines]
+    finally:
+        conn.close()
+
+
+def test_broker_fetch(broker):
+    response = broker_fetch(['a', 'b'], broker)
+    assert sorted(response['credentials']) == ['a', 'b']
+    assert response['errors'] == {}
+
+
+@pytest.mark.parametrize('line', [b'not json', b'[1, 2]', b'"x"', b'null'])
+def test_broker_rejects_non_object(broker, line):
+    """The connection stays open after an invalid request"""
+    invalid, valid = ask(broker, [line, json.dumps({'profiles': ['a']}).encode()])
+    assert invalid['errors']['']['code'] == 'InvalidRequest'
+    assert list(valid['credentials']) == ['a']
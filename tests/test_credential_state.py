@@ -0,0 +1,67 @@
+"""
+Summary:
+    Tests for core/credential_state.py
+"""
+import multiprocessing
+import credential_state as cs
+
+
+NOW = 1440938160            # 2015-08-30T12:36:00Z
+
+
+def test_parse_expiration():
+    assert cs.parse_expiration('2015-08-30T13:36:00Z') == NOW + 3600
+    assert cs.parse_expiration('2015-08-30T13:36:00+00:00') == NOW + 3600
+    assert cs.parse_expiration('2015-08-30T13:36:00.123Z') == NOW + 3600
+
+
+def test_record_remaining_due():
+    state = {}
+    cs.record(state, 'a', {'Expiration': '2015-08-30T13:36:00Z'}, now=NOW)
+    assert state == {'a': {'expiration': NOW + 3600, 'minted': NOW}}
+    assert cs.remaining(state, 'a', now=NOW) == 3600
+    assert cs.remaining(state, 'a', now=NOW + 7200) == 0
+    assert cs.remaining(state, 'unknown', now=NOW) == 0
+    assert not cs.due(state, 'a', 600, now=NOW)
+    assert cs.due(state, 'a', 600, now=NOW + 3000)
+    assert cs.due(state, 'unknown', 600, now=NOW)
+
+
+def test_load_state_missing_or_corrupt(tmp_path):
+    path = str(tmp_path / 'credential.state')
+    assert cs.load_state(path) == {}
+    with open(path, 'w') as f1:
+        f1.write('[1, 2]')
+    assert cs.load_state(path) == {}
+
+
+def test_update_state_merges(tmp_path):
+    path = str(tmp_path / 'credential.state')
+    cs.save_state(path, {'a': {'expiration': 1, 'minted': 0}, 'b': {'expiration': 2, 'minted': 0}})
+    merged = cs.update_state(path, {'b': {'expiration': 3, 'minted': 1}, 'c': {'expiration': 4, 'minted': 1}})
+    assert merged == cs.load_state(path)
+    assert {name: entry['expiration'] for name, entry in merged.items()} == {'a': 1, 'b': 3, 'c': 4}
+
+
+def _update(path, name):
+    cs.update_state(path, {name: {'expiration': 1, 'minted': 0}})
+
+
+def test_update_state_concurrent(tmp_path):
+    path = str(tmp_path / 'credential.state')
+    workers = [multiprocessing.Process(target=_update, args=(path, 'p{}'.format(i))) for i in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(cs.load_state(path)) == ['p{}'.format(i) for i in range(8)]
+
+
+def test_lower_expiration(tmp_path):
+    path = str(tmp_path / 'token.expiration')
+    assert cs.load_expiration(path) is None
+    cs.lower_expiration(path, NOW + 3600)
+    cs.lower_expiration(path, NOW + 7200)
+    assert cs.load_expiration(path) == NOW + 3600
+    cs.lower_expiration(path, NOW + 900)
+    assert cs.load_expiration(path) == NOW + 900
@@ -0,0 +1,173 @@
+"""
+Summary:
+    Tests for core/credentials_file.py
+"""
+import os
+import pytest
+from credentials_file import SLOT_ALIGN, SectionIndex, SectionWriter, slot
+
+
+SECTION_A = '[gcreds-a]\naws_access_key_id = AKIA1\naws_secret_access_key = s1\n'
+SECTION_B = '[gcreds-b]\naws_access_key_id = AKIA2\naws_secret_access_key = s2\n'
+USER = '[default]\naws_access_key_id = AKIAUSER\naws_secret_access_key = user\n'
+
+
+@pytest.fixture
+def files(tmp_path):
+    """(credentials file, section index) paths"""
+    return str(tmp_path / 'credentials'), str(tmp_path / 'sections.index')
+
+
+def content(path):
+    with open(path) as f1:
+        return f1.read()
+
+
+def write(path, text):
+    with open(path, 'w') as f1:
+        f1.write(text)
+
+
+# --- slot -------------------------------------------------------------------------------------
+
+
+def test_slot_pads_to_alignment():
+    data = slot(SECTION_A.encode())
+    assert len(data) == SLOT_ALIGN
+    assert data.startswith(SECTION_A.encode() + b'#')
+    assert data.endswith(b'\n')
+
+
+def test_slot_fixed_size():
+    assert len(slot(SECTION_A.encode(), 1024)) == 1024
+    assert slot(SECTION_A.encode(), len(SECTION_A)) == SECTION_A.encode()
+    assert slot(SECTION_A.encode(), len(SECTION_A) + 1) == SECTION_A.encode() + b'\n'
+
+
+def test_slot_too_small():
+    assert slot(SECTION_A.encode(), len(SECTION_A) - 1) is None
+
+
+# --- SectionIndex ------------------------------------------------------------------------------
+
+
+def test_index_scan(files):
+    path, index_file = files
+    write(path, USER + '\n' + SECTION_A)
+    index = SectionIndex(path, index_file)
+    assert index.names() == ['default', 'gcreds-a']
+    assert index.names('gcreds-') == ['gcreds-a']
+    assert index.read('gcreds-a') == SECTION_A
+    assert index.read('gcreds-x') is None
+
+
+def test_index_update_in_place(files):
+    path, index_file = files
+    write(path, USER)
+    index = SectionIndex(path, index_file)
+    assert index.update([('gcreds-a', SECTION_A.encode())])
+    size = os.path.getsize(path)
+    assert index.update([('gcreds-a', SECTION_A.replace('s1', 's9').encode())])
+    assert os.path.getsize(path) == size
+    assert content(path).startswith(USER)
+    assert 's9' in SectionIndex(path, index_file).read('gcreds-a')
+
+
+def test_index_update_outgrown_slot(files):
+    path, index_file = files
+    index = SectionIndex(path, index_file)
+    index.update([('gcreds-a', SECTION_A.encode())])
+    before = content(path)
+    assert not index.update([('gcreds-a', (SECTION_A + 'x' * SLOT_ALIGN + '\n').encode())])
+    assert content(path) == before
+
+
+def test_index_loaded_before_user_edit(files):
+    """An edit after the index was loaded moves the sections; the update must not overwrite it"""
+    path, index_file = files
+    SectionIndex(path, index_file).update([('gcreds-a', SECTION_A.encode())])
+    index = SectionIndex(path, index_file)
+    write(path, USER + '\n' + content(path))
+    assert index.update([('gcreds-a', SECTION_A.replace('s1', 's9').encode())])
+    fresh = SectionIndex(path, index_file)
+    assert fresh.names() == ['default', 'gcreds-a']
+    assert fresh.read('default').startswith(USER)
+    assert 's9' in fresh.read('gcreds-a')
+
+
+def test_index_interleaved_writers(files):
+    """A writer holding a stale index must not append a second copy of a section"""
+    path, index_file = files
+    first, second = SectionIndex(path, index_file), SectionIndex(path, index_file)
+    first.update([('gcreds-a', SECTION_A.encode())])
+    second.update([('gcreds-a', SECTION_A.replace('s1', 's9').encode()), ('gcreds-b', SECTION_B.encode())])
+    assert content(path).count('[gcreds-a]') == 1
+    fresh = SectionIndex(path, index_file)
+    assert fresh.names() == ['gcreds-a', 'gcreds-b']
+    assert 's9' in fresh.read('gcreds-a')
+
+
+def test_index_saved(files):
+    path, index_file = files
+    SectionIndex(path, index_file).update([('gcreds-a', SECTION_A.encode())])
+    assert os.path.exists(index_file)
+    assert not [name for name in os.listdir(os.path.dirname(index_file)) if name.endswith('.tmp')]
+
+
+# --- SectionWriter -----------------------------------------------------------------------------
+
+
+def test_writer_replaces_sections(files):
+    path, _ = files
+    write(path, USER + '\n' + SECTION_A)
+    writer = SectionWriter(path, batch_size=1)
+    writer.add('gcreds-a', SECTION_A.replace('s1', 's9'))
+    writer.add('gcreds-b', SECTION_B)
+    writer.commit()
+    text = content(path)
+    assert text.startswith(USER)
+    assert text.count('[gcreds-a]') == 1
+    assert 's9' in text and '[gcreds-b]' in text
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o644 & ~os.umask(os.umask(0)))
+
+
+def test_writer_drop(files):
+    path, _ = files
+    write(path, USER + '\n' + SECTION_A + '\n' + SECTION_B)
+    SectionWriter(path, drop=lambda name: name.startswith('gcreds-')).commit()
+    assert content(path) == USER
+
+
+def test_writer_keeps_index(files):
+    path, index_file = files
+    write(path, USER)
+    writer = SectionWriter(path, index=SectionIndex(path, index_file))
+    writer.add('gcreds-a', SECTION_A)
+    writer.commit()
+    index = SectionIndex(path, index_file)
+    assert index.names() == ['default', 'gcreds-a']
+    assert index.read('gcreds-a').startswith(SECTION_A)
+
+
+def test_writer_in_place_stale_index(files):
+    path, index_file = files
+    index = SectionIndex(path, index_file)
+    SectionIndex(path, index_file).update([('gcreds-a', SECTION_A.encode())])
+    writer = SectionWriter(path, index=index, in_place=True)
+    writer.add('gcreds-a', SECTION_A.replace('s1', 's9'))
+    writer.commit()
+    assert content(path).count('[gcreds-a]') == 1
+    assert 's9' in SectionIndex(path, index_file).read('gcreds-a')
+
+
+def test_writer_in_place_pads_once(files):
+    path, index_file = files
+    writer = SectionWriter(path, index=SectionIndex(path, index_file), in_place=True)
+    writer.add('gcreds-a', SECTION_A)
+    writer.add('gcreds-b', SECTION_B)
+    writer.commit()
+    index = SectionIndex(path, index_file)
+    for name in ('gcreds-a', 'gcreds-b'):
+        text = index.read(name)
+        assert len(text) == SLOT_ALIGN
+        assert text.count('#') == 1
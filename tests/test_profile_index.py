@@ -0,0 +1,97 @@
+"""
+Summary:
+    Tests for core/profile_index.py
+"""
+import json
+import os
+from profile_index import build_index, load_index, read_keys, section_keys
+
+
+CONFIG = """[default]
+region = us-east-1
+
+[profile hub]
+role_arn = arn:aws:iam::1:role/hub
+source_profile = user
+duration_seconds = 43200
+
+[profile user]
+region = eu-west-1
+"""
+CREDENTIALS = """[user]
+aws_access_key_id = AKIDUSER
+aws_secret_access_key = secret
+region = us-west-2
+mfa_serial = arn:aws:iam::1:mfa/user
+
+[gcreds-user]
+aws_access_key_id = ASIAUSER
+aws_secret_access_key = session-secret
+aws_session_token = token
+"""
+
+
+def write(path, text):
+    with open(path, 'w') as f1:
+        f1.write(text)
+    return str(path)
+
+
+def files(tmp_path):
+    return (
+        write(tmp_path / 'config', CONFIG),
+        write(tmp_path / 'credentials', CREDENTIALS),
+        str(tmp_path / 'profile.index')
+    )
+
+
+def test_build_index(tmp_path):
+    config, credentials, _ = files(tmp_path)
+    profiles = build_index(config, credentials)
+    assert profiles['hub'] == {
+        'role_arn': 'arn:aws:iam::1:role/hub', 'source_profile': 'user', 'duration_seconds': '43200'
+    }
+    # config file values win over the credentials file
+    assert profiles['user'] == {'region': 'eu-west-1', 'mfa_serial': 'arn:aws:iam::1:mfa/user', 'credentials': 'true'}
+    assert profiles['default'] == {'region': 'us-east-1'}
+
+
+def test_load_index_cached(tmp_path):
+    config, credentials, index = files(tmp_path)
+    profiles = load_index(config, credentials, index)
+    with open(index) as f1:
+        cached = f1.read()
+    assert 'secret' not in cached and 'AKIDUSER' not in cached
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')]
+
+    # unchanged sources: served from the index, not reparsed
+    data = json.loads(cached)
+    data['profiles']['hub']['region'] = 'cached'
+    write(index, json.dumps(data))
+    assert load_index(config, credentials, index)['hub']['region'] == 'cached'
+
+    # a changed source rebuilds the index
+    write(config, CONFIG + '\n[profile spoke]\nrole_arn = arn:aws:iam::2:role/spoke\nsource_profile = hub\n')
+    rebuilt = load_index(config, credentials, index)
+    assert 'region' not in rebuilt['hub']
+    assert rebuilt['spoke']['source_profile'] == 'hub'
+    assert set(rebuilt) == set(profiles) | {'spoke'}
+
+
+def test_load_index_corrupt(tmp_path):
+    config, credentials, index = files(tmp_path)
+    write(index, '[not an index')
+    assert load_index(config, credentials, index)['hub']['source_profile'] == 'user'
+
+
+def test_read_keys(tmp_path):
+    _, credentials, _ = files(tmp_path)
+    keys = read_keys(credentials)
+    assert keys['user'] == {'AccessKeyId': 'AKIDUSER', 'SecretAccessKey': 'secret', 'SessionToken': None}
+    assert keys['gcreds-user']['SessionToken'] == 'token'
+
+
+def test_section_keys():
+    assert section_keys(CREDENTIALS.split('\n\n')[1])['AccessKeyId'] == 'ASIAUSER'
+    assert section_keys('[empty]\nregion = us-east-1\n') is None
+    assert section_keys('not a section') is None
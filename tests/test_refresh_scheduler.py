@@ -0,0 +1,25 @@
+"""
+Summary:
+    Tests for core/refresh_scheduler.py
+"""
+import heapq
+import time
+from refresh_scheduler import RefreshScheduler
+
+
+def test_same_deadline_prefetch_and_profile():
+    """A prefetch and a profile refresh clamped to the same retry time must not compare names"""
+    now = time.time()
+    scheduler = RefreshScheduler(lambda: [(now - 10, 'refresh', None), (now - 10, 'refresh', 'p')], window=2)
+    scheduler.retry_after = time.monotonic() + 30
+    scheduler.rebuild()
+    assert len({entry[0] for entry in scheduler.heap if entry[2] == 'refresh'}) == 1
+    heapq.heappop(scheduler.heap)
+
+
+def test_prefetch_fires_once():
+    now = time.time()
+    scheduler = RefreshScheduler(lambda: [(now - 10, 'refresh', None)], window=2)
+    assert scheduler.next() == ('refresh', None)
+    scheduler.rebuild()
+    assert [entry[2] for entry in scheduler.heap] == ['display']
@@ -0,0 +1,38 @@
+"""
+Summary:
+    Tests for core/snapshot_store.py
+"""
+import os
+import snapshot_store
+
+
+USER = '[default]\naws_access_key_id = AKID\naws_secret_access_key = s\n'
+GCREDS = '\n[gcreds-a]\naws_access_key_id = ASIA\naws_secret_access_key = s\n'
+
+
+def test_save_unchanged_adds_no_generation(tmp_path, monkeypatch):
+    path, store = tmp_path / 'credentials', str(tmp_path / 'snapshots')
+    stamps = iter(['20150830T1236{:02d}'.format(i) for i in range(10)])
+    monkeypatch.setattr(snapshot_store.time, 'strftime', lambda fmt: next(stamps))
+    path.write_text(USER)
+    first = snapshot_store.save(str(path), store)
+
+    # gcreds sections are not part of a snapshot
+    path.write_text(USER + GCREDS)
+    assert snapshot_store.save(str(path), store) == first
+    assert snapshot_store.generations(store) == [first]
+
+    path.write_text(USER.replace('AKID', 'AKID2') + GCREDS)
+    second = snapshot_store.save(str(path), store)
+    assert snapshot_store.generations(store) == [first, second]
+    assert os.path.samefile(os.path.join(store, 'latest'), os.path.join(store, second))
+
+
+def test_save_unchanged_skips_pruning(tmp_path):
+    path, store = tmp_path / 'credentials', str(tmp_path / 'snapshots')
+    for i in range(3):
+        path.write_text(USER.replace('AKID', 'AKID{}'.format(i)))
+        snapshot_store.save(str(path), store)
+    snapshot_store.save(str(path), store, keep=1)
+    assert len(snapshot_store.generations(store)) == 3
+    assert len(os.listdir(os.path.join(store, 'objects'))) == 3
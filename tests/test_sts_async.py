@@ -0,0 +1,118 @@
+"""
+Summary:
+    Tests for core/sts_async.py
+"""
+import asyncio
+import datetime
+import pytest
+from sts_async import AsyncSTSClient
+from sts_client import STSError, sign_request, signing_key
+
+
+CREDENTIALS = {'AccessKeyId': 'AKIDEXAMPLE', 'SecretAccessKey': 'secret'}
+ASSUME_ROLE_RESPONSE = (
+    b'<AssumeRoleResponse><AssumeRoleResult><Credentials>'
+    b'<AccessKeyId>ASIAEXAMPLE</AccessKeyId><SecretAccessKey>s</SecretAccessKey>'
+    b'<SessionToken>t</SessionToken><Expiration>2015-08-30T13:36:00Z</Expiration>'
+    b'</Credentials></AssumeRoleResult></AssumeRoleResponse>'
+)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def serve(respond):
+    """Start a fake STS endpoint; respond(request number) returns the raw response bytes"""
+    served = {'connections': 0, 'requests': 0}
+    handlers = set()
+
+    async def handle(reader, writer):
+        handlers.add(asyncio.current_task())
+        served['connections'] += 1
+        try:
+            while True:
+                headers = await reader.readuntil(b'\r\n\r\n')
+                length = [int(line.split(b':')[1]) for line in headers.split(b'\r\n') if line.lower().startswith(b'content-length')][0]
+                await reader.readexactly(length)
+                served['requests'] += 1
+                writer.write(respond(served['requests']))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            handlers.discard(asyncio.current_task())
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    server.handlers = handlers
+    return server, 'http://127.0.0.1:{}'.format(server.sockets[0].getsockname()[1]), served
+
+
+async def shutdown(client, server):
+    client.close()
+    server.close()
+    for task in list(server.handlers):
+        task.cancel()
+    await asyncio.sleep(0)
+    await server.wait_closed()
+
+
+def ok(_):
+    return b'HTTP/1.1 200 OK\r\ncontent-length: ' + str(len(ASSUME_ROLE_RESPONSE)).encode() + b'\r\n\r\n' + ASSUME_ROLE_RESPONSE
+
+
+def chunked(_):
+    half = len(ASSUME_ROLE_RESPONSE) // 2
+    return b''.join([
+        b'HTTP/1.1 200 OK\r\ntransfer-encoding: chunked\r\n\r\n',
+        '{:x}\r\n'.format(half).encode(), ASSUME_ROLE_RESPONSE[:half], b'\r\n',
+        '{:x};ext=1\r\n'.format(len(ASSUME_ROLE_RESPONSE) - half).encode(), ASSUME_ROLE_RESPONSE[half:], b'\r\n',
+        b'0\r\n\r\n'
+    ])
+
+
+@pytest.mark.parametrize('respond', [ok, chunked])
+def test_pooled_calls_reuse_connections(respond):
+    async def main():
+        server, endpoint, served = await serve(respond)
+        client = AsyncSTSClient(CREDENTIALS, endpoint, pool_size=2)
+        try:
+            results = await asyncio.gather(*[
+                client.assume_role('arn:aws:iam::1:role/r{}'.format(i), 'gcreds', 900) for i in range(10)
+            ])
+        finally:
+            await shutdown(client, server)
+        return results, served
+    results, served = run(main())
+    assert [r['AccessKeyId'] for r in results] == ['ASIAEXAMPLE'] * 10
+    assert served == {'connections': 2, 'requests': 10}
+
+
+def test_malformed_status_line_fails_one_call():
+    async def main():
+        server, endpoint, _ = await serve(lambda n: b'garbage\r\n\r\n' if n == 1 else ok(n))
+        client = AsyncSTSClient(CREDENTIALS, endpoint, pool_size=1)
+        try:
+            with pytest.raises(STSError) as e:
+                await client.assume_role('arn:aws:iam::1:role/a', 'gcreds', 900)
+            assert e.value.code == 'ConnectionError'
+            return await client.assume_role('arn:aws:iam::1:role/a', 'gcreds', 900)
+        finally:
+            await shutdown(client, server)
+    assert run(main())['AccessKeyId'] == 'ASIAEXAMPLE'
+
+
+def test_signing_key_derived_once_per_day():
+    signing_key.cache_clear()
+    for second in range(5):
+        sign_request(CREDENTIALS, 'sts.amazonaws.com', 'us-east-1', 'Action=AssumeRole',
+                     now=datetime.datetime(2015, 8, 30, 12, 36, second))
+    sign_request(CREDENTIALS, 'sts.amazonaws.com', 'us-east-1', 'Action=AssumeRole',
+                 now=datetime.datetime(2015, 8, 31))
+    info = signing_key.cache_info()
+    assert (info.misses, info.hits) == (2, 4)
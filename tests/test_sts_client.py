@@ -0,0 +1,125 @@
+"""
+Summary:
+    Tests for core/sts_client.py
+"""
+import datetime
+import http.server
+import threading
+import urllib.parse
+import pytest
+from sts_client import STSClient, STSError, build_query, parse_credentials, parse_error, sign_request, signing_key
+
+
+SECRET = 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY'
+CREDENTIALS = {'AccessKeyId': 'AKIDEXAMPLE', 'SecretAccessKey': SECRET}
+NOW = datetime.datetime(2015, 8, 30, 12, 36, 0)
+
+ASSUME_ROLE_RESPONSE = '''<AssumeRoleResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <AssumeRoleResult>
+    <Credentials>
+      <AccessKeyId>ASIAEXAMPLE</AccessKeyId>
+      <SecretAccessKey>secret</SecretAccessKey>
+      <SessionToken>token</SessionToken>
+      <Expiration>2015-08-30T13:36:00Z</Expiration>
+    </Credentials>
+  </AssumeRoleResult>
+</AssumeRoleResponse>'''
+
+ERROR_RESPONSE = '''<ErrorResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <Error><Type>Sender</Type><Code>Throttling</Code><Message>Rate exceeded</Message></Error>
+</ErrorResponse>'''
+
+
+def test_signing_key_vector():
+    """Derived key example of the AWS Signature Version 4 documentation"""
+    key = signing_key(SECRET, '20150830', 'us-east-1', 'iam')
+    assert key.hex() == 'c4afb1cc5771d871763a393e44b703571b55cc28424d1a5e86da6ed3c154a4b9'
+
+
+@pytest.mark.parametrize('token, signed, signature', [
+    (None, 'content-type;host;x-amz-date',
+     '5cc620e2ef4863b77ac2a06c99853f24f3d183eea2b13660f88c79b84a90433b'),
+    ('TOKEN', 'content-type;host;x-amz-date;x-amz-security-token',
+     'd832d336074af5c657ad41b56d4cbeec299a6eb5d814206b497f264e50ec5e8e'),
+])
+def test_sign_request_vector(token, signed, signature):
+    """Signatures of the same request computed by the botocore SigV4 signer"""
+    credentials = dict(CREDENTIALS, SessionToken=token) if token else CREDENTIALS
+    body = build_query('AssumeRole', {
+        'RoleArn': 'arn:aws:iam::123456789012:role/demo', 'RoleSessionName': 'gcreds', 'DurationSeconds': 3600
+    })
+    headers = sign_request(credentials, 'sts.amazonaws.com', 'us-east-1', body, NOW)
+    assert headers['x-amz-date'] == '20150830T123600Z'
+    assert headers['authorization'] == (
+        'AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/20150830/us-east-1/sts/aws4_request, '
+        'SignedHeaders={}, Signature={}'.format(signed, signature)
+    )
+
+
+def test_build_query():
+    body = build_query('AssumeRole', {'RoleArn': 'arn:aws:iam::1:role/a b', 'ExternalId': None})
+    assert body == 'Action=AssumeRole&RoleArn=arn%3Aaws%3Aiam%3A%3A1%3Arole%2Fa%20b&Version=2011-06-15'
+
+
+def test_parse_credentials():
+    assert parse_credentials(ASSUME_ROLE_RESPONSE) == {
+        'AccessKeyId': 'ASIAEXAMPLE', 'SecretAccessKey': 'secret',
+        'SessionToken': 'token', 'Expiration': '2015-08-30T13:36:00Z'
+    }
+    with pytest.raises(STSError) as e:
+        parse_credentials('<html>')
+    assert e.value.code == 'MalformedResponse'
+
+
+def test_parse_error():
+    error = parse_error(ERROR_RESPONSE, 400)
+    assert (error.code, error.message, error.status) == ('Throttling', 'Rate exceeded', 400)
+    assert parse_error('Bad Gateway', 502).code == 'HTTP502'
+
+
+class FakeSTS(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        self.requests.append((dict(urllib.parse.parse_qsl(body)), self.headers['Authorization']))
+        status, payload = (400, ERROR_RESPONSE) if 'denied' in body else (200, ASSUME_ROLE_RESPONSE)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    server = http.server.HTTPServer(('127.0.0.1', 0), FakeSTS)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeSTS.requests = []
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_assume_role(endpoint):
+    client = STSClient(CREDENTIALS, endpoint)
+    try:
+        assert client.assume_role('arn:aws:iam::1:role/a', 'gcreds', 900)['AccessKeyId'] == 'ASIAEXAMPLE'
+        with pytest.raises(STSError) as e:
+            client.assume_role('arn:aws:iam::1:role/denied', 'gcreds', 900)
+        assert e.value.code == 'Throttling'
+    finally:
+        client.close()
+    params, authorization = FakeSTS.requests[0]
+    assert params['Action'] == 'AssumeRole' and params['DurationSeconds'] == '900'
+    assert authorization.startswith('AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/')
+
+
+def test_client_connection_error():
+    client = STSClient(CREDENTIALS, 'http://127.0.0.1:1')
+    with pytest.raises(STSError) as e:
+        client.assume_role('arn:aws:iam::1:role/a', 'gcreds', 900)
+    assert e.value.code == 'ConnectionError'
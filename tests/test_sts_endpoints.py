@@ -0,0 +1,67 @@
+"""
+Summary:
+    Tests for core/sts_endpoints.py
+"""
+import json
+import time
+import pytest
+import sts_endpoints
+from sts_endpoints import endpoint, partition_of, profile_partition, profile_region, select_region
+
+
+@pytest.mark.parametrize('region, partition, expected', [
+    (None, 'aws', ('https://sts.amazonaws.com', 'us-east-1')),
+    ('global', 'aws', ('https://sts.amazonaws.com', 'us-east-1')),
+    ('eu-west-1', 'aws', ('https://sts.eu-west-1.amazonaws.com', 'eu-west-1')),
+    (None, 'aws-cn', ('https://sts.cn-north-1.amazonaws.com.cn', 'cn-north-1')),
+    ('cn-northwest-1', 'aws-cn', ('https://sts.cn-northwest-1.amazonaws.com.cn', 'cn-northwest-1')),
+    (None, 'aws-us-gov', ('https://sts.us-gov-west-1.amazonaws.com', 'us-gov-west-1')),
+    ('us-gov-east-1', 'aws-us-gov', ('https://sts.us-gov-east-1.amazonaws.com', 'us-gov-east-1'))
+])
+def test_endpoint(region, partition, expected):
+    assert endpoint(region, partition) == expected
+
+
+def test_partition_of():
+    assert partition_of('cn-north-1') == 'aws-cn'
+    assert partition_of('us-gov-west-1') == 'aws-us-gov'
+    assert partition_of('us-west-2') == 'aws'
+    assert partition_of(arn='arn:aws-cn:iam::1:role/r') == 'aws-cn'
+    assert partition_of(arn='arn:unknown:iam::1:role/r') == 'aws'
+    assert partition_of() == 'aws'
+
+
+def test_profile_partition():
+    assert profile_partition({'role_arn': 'arn:aws-us-gov:iam::1:role/r', 'region': 'us-east-1'}) == 'aws-us-gov'
+    assert profile_partition({'mfa_serial': 'arn:aws-cn:iam::1:mfa/u'}) == 'aws-cn'
+    assert profile_partition({'region': 'cn-north-1'}) == 'aws-cn'
+    assert profile_partition({}) is None
+
+
+def test_profile_region(monkeypatch):
+    monkeypatch.delenv('AWS_STS_REGIONAL_ENDPOINTS', raising=False)
+    assert profile_region({'sts_region': 'eu-west-1', 'region': 'us-west-2'}) == 'eu-west-1'
+    assert profile_region({'region': 'us-west-2'}) is None
+    assert profile_region({'region': 'us-west-2', 'sts_regional_endpoints': 'regional'}) == 'us-west-2'
+    monkeypatch.setenv('AWS_STS_REGIONAL_ENDPOINTS', 'regional')
+    assert profile_region({'region': 'us-west-2'}) == 'us-west-2'
+
+
+def test_select_region_cache(tmp_path, monkeypatch):
+    cache = str(tmp_path / 'probe.json')
+    probes = []
+    monkeypatch.setattr(sts_endpoints, 'probe', lambda: probes.append(1) or [('eu-north-1', 0.012), ('us-east-1', 0.09)])
+
+    assert select_region(cache) == 'eu-north-1'
+    assert select_region(cache) == 'eu-north-1'
+    assert len(probes) == 1
+
+    with open(cache, 'w') as f1:
+        json.dump({'region': 'us-east-1', 'probed': int(time.time()) - 2 * sts_endpoints.PROBE_MAX_AGE}, f1)
+    assert select_region(cache) == 'eu-north-1'
+    assert len(probes) == 2
+
+
+def test_select_region_unreachable(tmp_path, monkeypatch):
+    monkeypatch.setattr(sts_endpoints, 'probe', lambda: [])
+    assert select_region(str(tmp_path / 'probe.json')) is None
@@ -0,0 +1,100 @@
+"""
+Summary:
+    Tests for core/throttle.py
+"""
+import asyncio
+import pytest
+from sts_client import STSError
+from throttle import AdaptiveLimiter, backoff, is_retryable, is_throttle
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_is_throttle():
+    assert is_throttle(STSError('Throttling', 'Rate exceeded', 400))
+    assert not is_throttle(STSError('AccessDenied', 'denied', 403))
+    assert not is_throttle(ValueError())
+
+
+@pytest.mark.parametrize('error, retry', [
+    (STSError('Throttling', 'Rate exceeded', 400), True),
+    (STSError('ConnectionError', 'reset'), True),
+    (STSError('InternalError', 'boom', 503), True),
+    (STSError('AccessDenied', 'denied', 403), False),
+    (STSError('ExpiredToken', 'expired', 403), False)
+])
+def test_is_retryable(error, retry):
+    assert is_retryable(error) is retry
+
+
+def test_backoff_full_jitter():
+    delays = [backoff(attempt, base=1, cap=8) for attempt in range(6) for _ in range(20)]
+    assert all(0 <= d <= 8 for d in delays)
+    assert all(backoff(0, base=1, cap=8) <= 1 for _ in range(20))
+    assert len(set(delays)) > 1
+
+
+def test_limiter_additive_increase():
+    async def main():
+        limiter = AdaptiveLimiter(8, initial=2)
+        for _ in range(4):
+            await limiter.release(await limiter.acquire())
+        return limiter
+    limiter = run(main())
+    # +1/limit per success: one window of successes grows the limit by about one
+    assert 3 < limiter.limit < 4
+    assert limiter.in_flight == 0
+
+
+def test_limiter_capped_at_maximum():
+    async def main():
+        limiter = AdaptiveLimiter(3)
+        for _ in range(50):
+            await limiter.release(await limiter.acquire())
+        return limiter
+    assert run(main()).limit == 3
+
+
+def test_limiter_multiplicative_decrease_once_per_burst():
+    async def main():
+        limiter = AdaptiveLimiter(16, initial=8)
+        tokens = [await limiter.acquire() for _ in range(8)]
+        for token in tokens:
+            await limiter.release(token, throttled=True)
+        burst = limiter.limit
+        await limiter.release(await limiter.acquire(), throttled=True)
+        return burst, limiter
+    burst, limiter = run(main())
+    assert burst == 4
+    assert limiter.limit == 2
+    assert limiter.throttled == 9
+
+
+def test_limiter_floor():
+    async def main():
+        limiter = AdaptiveLimiter(4, initial=1)
+        await limiter.release(await limiter.acquire(), throttled=True)
+        return limiter
+    assert run(main()).limit == 1
+
+
+def test_limiter_bounds_in_flight():
+    async def main():
+        limiter = AdaptiveLimiter(8, initial=2)
+        peak = [0]
+
+        async def request():
+            token = await limiter.acquire()
+            peak[0] = max(peak[0], limiter.in_flight)
+            await asyncio.sleep(0)
+            await limiter.release(token, throttled=True)
+
+        await asyncio.gather(*[request() for _ in range(6)])
+        return peak[0]
+    assert run(main()) == 2